@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+from blocking import ResourceBlocker
+from browser import launch_options, search_url
+from config import *
+from database import shared_database
+from metrics import metrics
+from parsers import (CAPTCHA_SELECTOR, CARD_COUNT_ARGS, CARD_COUNT_JS, CARD_EXTRACT_ARGS, CARD_EXTRACT_JS,
+                     is_captcha_url, is_search_api_response, parse_card_records, parse_search_items)
+from session import SessionManager, is_login_page
+
+
+class DomainPacer:
+    """Spaces out navigations to the same host by at least `interval` seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._locks = {}
+        self._last = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._last.get(host, 0) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last[host] = time.monotonic()
+
+
+class AsyncScrapeEngine:
+    """Scrapes many keywords at once over several contexts of one browser.
+
+    Every context starts from the same saved login. A keyword keeps one
+    context but loads its pages in parallel tabs, so up to `concurrency`
+    pages are in flight however many keywords there are. Each finished
+    page is written to the database straight away through a single writer
+    thread, so partial results survive a failure and SQLite only sees one
+    writer.
+
+    on_captcha(url), if given, is called on a worker thread when a page
+    shows a CAPTCHA; the page then waits up to captcha_timeout seconds for
+    it to be solved.
+    """
+
+    def __init__(self, db_name=DB_NAME, base_url=BASE_URL, contexts=BROWSER_CONTEXTS,
+                 concurrency=CONCURRENCY, page_interval=PAGE_INTERVAL, headless=HEADLESS,
+                 channel=BROWSER_CHANNEL, storage_state_file=STORAGE_STATE_FILE,
+                 response_timeout=15, captcha_timeout=120, on_captcha=None, human_delays=HUMAN_DELAYS):
+        self.db_name = db_name
+        self.base_url = base_url
+        self.contexts = contexts
+        self.concurrency = concurrency
+        self.pacer = DomainPacer(page_interval)
+        self.headless = headless
+        self.channel = channel
+        self.session = SessionManager(storage_state_file)
+        self.on_captcha = on_captcha
+        self.human_delays = human_delays
+        self.pages_stored = 0
+        self.failed = []
+        self.response_timeout = response_timeout
+        self.captcha_timeout = captcha_timeout
+        self.page_stats = []
+        self.blocker = ResourceBlocker() if BLOCK_RESOURCES else None
+        self.db = None
+        self._db_executor = None
+        self._page_slots = None
+
+    async def _db_call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+
+    async def _new_context(self, browser):
+        if self.session.state() is not None:
+            context = await browser.new_context(storage_state=self.session.state())
+        else:
+            context = await browser.new_context()
+            if os.path.exists(COOKIE_FILE):
+                with open(COOKIE_FILE, 'r') as f:
+                    await context.add_cookies(json.load(f))
+        return context
+
+    async def _wait_for_captcha(self, page):
+        deadline = time.monotonic() + self.captcha_timeout
+        announced = False
+        while is_captcha_url(page.url) or await page.query_selector(CAPTCHA_SELECTOR):
+            if not announced:
+                print(f"CAPTCHA detected on {page.url}, waiting for it to be solved...")
+                metrics.incr('captchas_total')
+                if self.on_captcha is not None:
+                    # May block (e.g. run a command); keep it off the event
+                    # loop so the other keywords carry on meanwhile
+                    asyncio.get_running_loop().run_in_executor(None, self.on_captcha, page.url)
+                announced = True
+            if time.monotonic() > deadline:
+                raise RuntimeError("CAPTCHA was not solved in time")
+            await asyncio.sleep(2)
+
+    async def _scroll_until_loaded(self, page, keyword, page_index):
+        with metrics.span('page.scroll', info={'keyword': keyword, 'page': page_index + 1}):
+            await self._scroll(page, keyword, page_index)
+
+    async def _scroll(self, page, keyword, page_index):
+        start = time.monotonic()
+        scrolls = 0
+        unchanged = 0
+        last_counts = None
+        while True:
+            cards, hydrated = await page.evaluate(CARD_COUNT_JS, CARD_COUNT_ARGS)
+            if cards and hydrated >= cards:
+                break
+            unchanged = unchanged + 1 if (cards, hydrated) == last_counts else 0
+            if unchanged >= SCROLL_STABLE_CHECKS or scrolls >= MAX_SCROLLS:
+                break
+            last_counts = (cards, hydrated)
+
+            await page.mouse.wheel(0, 800)
+            scrolls += 1
+            if self.human_delays:
+                await asyncio.sleep(random.uniform(*SCROLL_DELAY))
+
+        self.page_stats.append({'keyword': keyword, 'page': page_index + 1, 'scrolls': scrolls,
+                                'seconds': round(time.monotonic() - start, 2),
+                                'cards': cards, 'hydrated': hydrated})
+        metrics.incr('scrolls_total', scrolls)
+
+    async def _scrape_page(self, context, keyword, page_index):
+        url = search_url(keyword, page_index, self.base_url)
+        responses = []
+
+        def on_response(response):
+            if is_search_api_response(response.url):
+                responses.append(response)
+
+        info = {'keyword': keyword, 'page': page_index + 1}
+        async with self._page_slots:
+            await self.pacer.wait(url)
+            page = await context.new_page()
+            if self.blocker is not None:
+                await self.blocker.attach_async(page)
+            page.on("response", on_response)
+            try:
+                with metrics.span('page.goto', info=info):
+                    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                if is_login_page(page.url):
+                    # Nothing here can log in; make the next GUI scrape verify the session
+                    self.session.invalidate()
+                    raise RuntimeError("The saved login has expired; log in again with the GUI")
+                await self._wait_for_captcha(page)
+
+                with metrics.span('page.api_wait', info=info):
+                    deadline = time.monotonic() + self.response_timeout
+                    while not responses and time.monotonic() < deadline:
+                        await page.wait_for_timeout(100)
+                if responses:
+                    payload = await responses[-1].json()
+                    with metrics.span('page.parse', info=info, source='api'):
+                        return parse_search_items(payload, self.base_url)
+
+                # No API response (or a stand-in that only serves HTML):
+                # scroll so the cards hydrate and read them in the page
+                metrics.incr('api_fallbacks_total')
+                await self._scroll_until_loaded(page, keyword, page_index)
+                with metrics.span('page.extract_js', info=info):
+                    return parse_card_records(await page.evaluate(CARD_EXTRACT_JS, CARD_EXTRACT_ARGS),
+                                              self.base_url)
+            finally:
+                await page.close()
+
+    async def _scrape_keyword(self, contexts, keyword, max_pages, resume):
+        context = await contexts.get()
+        resumable = await self._db_call(self.db.get_resumable_run, keyword) if resume else None
+        if resumable is not None:
+            run_id, start_page = resumable
+            print(f"[{keyword}] resuming run {run_id} from page {start_page}")
+        else:
+            run_id, start_page = await self._db_call(self.db.start_run, keyword), 1
+        stored = 0
+        # Every page is fetched at once, limited only by the shared page
+        # slots; results are stored in page order so the checkpoint never
+        # skips a page, and an empty page cancels the ones after it
+        fetches = {page_index: asyncio.ensure_future(self._scrape_page(context, keyword, page_index))
+                   for page_index in range(start_page - 1, max_pages)}
+        try:
+            for page_index, fetch in fetches.items():
+                products = await fetch
+                if not products:
+                    print(f"[{keyword}] no products on page {page_index + 1}, stopping")
+                    break
+                url = search_url(keyword, page_index, self.base_url)
+                stored += await self._db_call(self.db.insert_page, run_id, page_index + 1, products, url)
+                self.pages_stored += 1
+                metrics.incr('pages_total')
+                metrics.incr('products_total', len(products))
+                print(f"[{keyword}] page {page_index + 1}: {len(products)} products ({stored} stored)")
+            await self._db_call(self.db.finish_run, run_id, 'completed')
+        except Exception as e:
+            print(f"[{keyword}] scrape failed: {e}")
+            self.failed.append(keyword)
+            await self._db_call(self.db.finish_run, run_id, 'failed')
+        finally:
+            for fetch in fetches.values():
+                fetch.cancel()
+            await asyncio.gather(*fetches.values(), return_exceptions=True)
+            contexts.put_nowait(context)
+        return stored
+
+    async def run(self, keywords, max_pages=3, resume=False):
+        """Scrape every keyword and return {keyword: products stored}"""
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+        self._page_slots = asyncio.Semaphore(self.concurrency)
+        self.db = await self._db_call(shared_database, self.db_name)
+        try:
+            async with async_playwright() as playwright:
+                browser = await playwright.chromium.launch(**launch_options(headless=self.headless, channel=self.channel))
+                contexts = asyncio.Queue()
+                for _ in range(min(self.contexts, len(keywords))):
+                    contexts.put_nowait(await self._new_context(browser))
+
+                counts = await asyncio.gather(*(self._scrape_keyword(contexts, keyword, max_pages, resume)
+                                                for keyword in keywords))
+                await browser.close()
+                if self.blocker is not None:
+                    print(self.blocker.summary())
+                return dict(zip(keywords, counts))
+        finally:
+            await self._db_call(self.db.close_thread)
+            self._db_executor.shutdown()
+
+
+def run_keywords(keywords, max_pages=3, resume=False, **options):
+    """Blocking helper for callers that are not running an event loop"""
+    return asyncio.run(AsyncScrapeEngine(**options).run(keywords, max_pages, resume))
@@ -0,0 +1,58 @@
+"""Compare per-row commits against batched inserts in DatabaseManager.
+
+Usage: python benchmarks/bench_db_insert.py [rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+
+def make_products(count):
+    products = []
+    for i in range(count):
+        products.append({
+            'name': f"Sample product {i}",
+            'price': f"₱{random.randint(50, 5000):,}",
+            'sold': f"{random.randint(1, 99)}.{random.randint(0, 9)}K+ sold",
+            'link': f"https://shopee.ph/sample-i.{random.randint(1, 10**6)}.{i}",
+        })
+    return products
+
+
+def run(label, db_path, products, batched, legacy_pragmas):
+    db = DatabaseManager(db_path)
+    if legacy_pragmas:
+        # What every connection used before WAL was enabled
+        db.cursor.execute("PRAGMA journal_mode=DELETE")
+        db.cursor.execute("PRAGMA synchronous=FULL")
+    run_id = db.start_run("bench")
+
+    start = time.perf_counter()
+    if batched:
+        db.insert_products(run_id, products)
+    else:
+        for product in products:
+            db.insert_product(run_id, product)
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    print(f"{label:<32} {len(products):>8} rows  {elapsed:8.3f}s  {len(products) / elapsed:12,.0f} rows/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    products = make_products(count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run("before: insert_product loop", os.path.join(tmp, "before.db"), products, False, True)
+        run("after: insert_products + WAL", os.path.join(tmp, "after.db"), products, True, False)
+
+
+if __name__ == "__main__":
+    main()
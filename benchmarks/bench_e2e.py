@@ -0,0 +1,95 @@
+"""End-to-end scrape benchmark against the local stand-in server.
+
+Runs a real headless browser through login, search, pagination, parsing
+and the SQLite writes, but against benchmarks/standin_server.py instead
+of shopee.ph, with the human-like delays turned off. Nothing leaves the
+machine, so numbers are comparable between runs and changes. Needs
+Playwright's Chromium (playwright install chromium).
+
+Usage: python benchmarks/bench_e2e.py [--pages 10] [--keywords 3]
+           [--extraction api|js|dom] [--navigation url|click] [--engine sync|async]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_scraper import AsyncScrapeEngine
+from benchutil import peak_rss_mb
+from metrics import metrics
+from scraper import ShopeeScraper
+from session import SessionManager
+from standin_server import StandInServer
+
+
+def run_sync(server, keywords, args, workdir):
+    login = ("bench", "bench") if args.require_login else (None, None)
+    for keyword in keywords:
+        scraper = ShopeeScraper(headless=True, db_name=os.path.join(workdir, "bench.db"),
+                                base_url=server.url, human_delays=False, channel=None,
+                                session=SessionManager(os.path.join(workdir, "state.json")))
+        scraper.cookie_file = os.path.join(workdir, "cookies.json")
+        scraper.extraction_mode = args.extraction
+        scraper.navigation_mode = args.navigation
+        scraper.scrape(keyword, *login, max_pages=args.pages)
+
+
+def run_async(server, keywords, args, workdir):
+    engine = AsyncScrapeEngine(db_name=os.path.join(workdir, "bench.db"), base_url=server.url,
+                               page_interval=0, headless=True, channel=None,
+                               storage_state_file=os.path.join(workdir, "state.json"),
+                               captcha_timeout=0, human_delays=False)
+    asyncio.run(engine.run(keywords, args.pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a full scrape against the local stand-in server")
+    parser.add_argument('--pages', type=int, default=10, help="result pages per keyword (default: 10)")
+    parser.add_argument('--keywords', type=int, default=3, help="keywords to scrape (default: 3)")
+    parser.add_argument('--extraction', default='api', choices=['api', 'js', 'dom'])
+    parser.add_argument('--navigation', default='url', choices=['url', 'click'])
+    parser.add_argument('--engine', default='sync', choices=['sync', 'async'])
+    parser.add_argument('--require-login', action='store_true', help="go through the login form first")
+    args = parser.parse_args()
+
+    keywords = [f"bench keyword {i}" for i in range(args.keywords)]
+    server = StandInServer(pages=args.pages, require_login=args.require_login).start()
+    metrics.reset()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            start = time.perf_counter()
+            if args.engine == 'sync':
+                run_sync(server, keywords, args, workdir)
+            else:
+                run_async(server, keywords, args, workdir)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    pages = metrics.counter_total('pages_total')
+    items = metrics.counter_total('products_total')
+    parse = sum(metrics.histogram_sum(name) for name in
+                ('page_parse_seconds', 'page_extract_js_seconds', 'page_content_seconds'))
+    db_write = metrics.histogram_sum('db_write_seconds')
+
+    label = args.engine if args.engine == 'async' else f"sync/{args.extraction}/{args.navigation}"
+    print(f"{label}: {pages:.0f} pages, {items:.0f} items in {elapsed:.2f}s")
+    if not pages:
+        print("No pages were scraped; check the output above for browser errors")
+        return 1
+    print(f"  {pages / elapsed:8.2f} pages/s   {items / elapsed:10.1f} items/s")
+    print(f"  parse    {parse:8.3f}s  ({parse / pages * 1000:.1f} ms/page)")
+    print(f"  db write {db_write:8.3f}s  ({db_write / pages * 1000:.1f} ms/page)")
+    # RUSAGE_CHILDREN is the largest waited-for child, i.e. the biggest browser process
+    print(f"  peak RSS {peak_rss_mb():8.1f} MB python, "
+          f"{peak_rss_mb(resource.RUSAGE_CHILDREN):8.1f} MB largest browser process")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Benchmark the exporters on a synthetic database of stored observations.
+
+The database is built once (1,000,000 rows by default) and kept in the
+temp directory between runs. Each format is exported in its own process
+so its peak RSS is measured on its own.
+
+Usage: python benchmarks/bench_export.py [rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import peak_rss_mb, run_variants, variant_args
+from database import DatabaseManager
+from export import available_formats, export
+
+ITEMS_PER_RUN = 1000
+
+
+def build_database(path, rows):
+    if os.path.exists(path):
+        return
+    print(f"Building {rows:,} rows in {path}...")
+    db = DatabaseManager(path)
+    random.seed(1)
+    runs = max(1, rows // ITEMS_PER_RUN)
+    with db.transaction():
+        db.cursor.executemany(
+            "INSERT INTO products (id, shop_id, name, link) VALUES (?, ?, ?, ?)",
+            ((item_id, item_id % 997, f"Sample product {item_id} with a longer descriptive name",
+              f"https://shopee.ph/product/{item_id % 997}/{item_id}") for item_id in range(ITEMS_PER_RUN))
+        )
+    for run in range(runs):
+        keyword = f"keyword {run % 20}"
+        with db.transaction():
+            run_id = db._start_run(keyword)
+            day = f"2024-{1 + run // 250 % 12:02d}-{1 + run % 28:02d} 10:00:00"
+            observations = []
+            for item_id in range(ITEMS_PER_RUN):
+                price = random.randint(50, 5000)
+                sold = random.randint(0, 20000)
+                observations.append((item_id, run_id, f"₱{price:,}", f"{sold:,} sold",
+                                     price * 100, price * 100, sold, day))
+            db.cursor.executemany(
+                """INSERT INTO observations (product_id, run_id, price, sold, price_min, price_max, sold_count, ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                observations
+            )
+    with db.transaction():
+        db._roll_up()
+    db.close()
+
+
+def run_format(format, db_path):
+    db = DatabaseManager(db_path)
+    out_path = os.path.join(tempfile.gettempdir(), f"bench_export.{format}")
+    start = time.perf_counter()
+    count = export(db, out_path, format)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(out_path) / (1024 * 1024)
+    os.remove(out_path)
+    db.close()
+
+    print(f"{format:<8} {count:>10,} rows  {count / elapsed:12,.0f} rows/s  {elapsed:7.2f}s  "
+          f"{size_mb:8.1f} MB file  {peak_rss_mb():8.1f} MB peak RSS")
+
+
+def main():
+    args = variant_args("--format")
+    if args is not None:
+        run_format(*args)
+        return
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    db_path = os.path.join(tempfile.gettempdir(), f"bench_export_{rows}.db")
+    build_database(db_path, rows)
+    run_variants(__file__, "--format", available_formats(), db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compare search API extraction with page parsing on the recorded fixtures.
+
+Usage: python benchmarks/bench_extract.py [iterations]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import parse_item_ids
+from parsers import parse_search_html, parse_search_items
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def timed(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        products = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<6} {len(products):>4} products/page  {elapsed / iterations * 1000:8.3f} ms/page  "
+          f"{len(products) * iterations / elapsed:12,.0f} products/s")
+    return products
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    with open(os.path.join(FIXTURES, "search_items.json"), encoding="utf-8") as f:
+        body = f.read()
+    with open(os.path.join(FIXTURES, "search_page.html"), encoding="utf-8") as f:
+        html = f.read()
+
+    api_products = timed("api", lambda: parse_search_items(json.loads(body)), iterations)
+    dom_products = timed("dom", lambda: parse_search_html(html), iterations)
+
+    api_ids = [product['item_id'] for product in api_products]
+    dom_ids = [parse_item_ids(product['link'])[1] for product in dom_products]
+    print("Both modes found the same items" if api_ids == dom_ids else "Item ids differ between modes")
+
+
+if __name__ == "__main__":
+    main()
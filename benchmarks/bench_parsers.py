@@ -0,0 +1,56 @@
+"""Benchmark the HTML parser backends over a corpus of saved search pages.
+
+Each backend runs in its own process so its peak RSS is measured on its own.
+
+Usage: python benchmarks/bench_parsers.py [corpus_dir] [iterations]
+"""
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import peak_rss_mb, run_variants, variant_args
+from parsers import available_backends, parse_search_html
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def run_backend(backend, corpus, iterations):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    if not pages:
+        print(f"No .html files found in {corpus}")
+        return
+
+    # Warm up so selector compilation is not counted
+    parse_search_html(pages[0], backend)
+
+    cards = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for html in pages:
+            cards += len(parse_search_html(html, backend))
+    elapsed = time.perf_counter() - start
+
+    print(f"{backend:<12} {len(pages) * iterations:>6} pages  {cards / elapsed:12,.0f} cards/s  "
+          f"{elapsed / (len(pages) * iterations) * 1000:8.2f} ms/page  {peak_rss_mb():8.1f} MB peak RSS")
+
+
+def main():
+    args = variant_args("--backend")
+    if args is not None:
+        backend, corpus, iterations = args
+        run_backend(backend, corpus, int(iterations))
+        return
+
+    corpus = sys.argv[1] if len(sys.argv) > 1 else FIXTURES
+    iterations = sys.argv[2] if len(sys.argv) > 2 else "20"
+    run_variants(__file__, "--backend", available_backends(), corpus, iterations)
+
+
+if __name__ == "__main__":
+    main()
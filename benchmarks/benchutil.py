@@ -0,0 +1,26 @@
+"""Helpers shared by the benchmarks that report peak memory."""
+import os
+import resource
+import subprocess
+import sys
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak RSS in MB of this process, or with RUSAGE_CHILDREN of the
+    largest child process waited for"""
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def variant_args(flag):
+    """The arguments after flag if this process was started by run_variants(), else None"""
+    if len(sys.argv) > 1 and sys.argv[1] == flag:
+        return sys.argv[2:]
+    return None
+
+
+def run_variants(script, flag, variants, *args):
+    """Run `script flag <variant> args...` in a fresh interpreter per variant,
+    so each one's peak RSS is measured on its own"""
+    for variant in variants:
+        subprocess.run([sys.executable, os.path.abspath(script), flag, variant, *map(str, args)])
@@ -0,0 +1,192 @@
+"""Local stand-in for the parts of shopee.ph the scraper touches.
+
+Serves a home page with the search box and the logged-in avatar, a login
+form, Top Sales search result pages with working pagination, and the
+search_items API the pages call, all built from the recorded fixtures.
+Every page gets its own item ids so runs store distinct products.
+
+Usage: python benchmarks/standin_server.py [--port 8000] [--pages 10] [--require-login]
+"""
+import argparse
+import html
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SESSION_COOKIE = "SPC_U=standin"
+
+_PAGE = """<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Shopee stand-in</title></head>
+<body><header>
+<input class="shopee-searchbar-input__input" value="{keyword}">
+<button class="shopee-searchbar__search-button"
+        onclick="location.href='/search?keyword=' + encodeURIComponent(document.querySelector('input').value) + '&page=0'">Search</button>
+{avatar}
+</header>
+<div id="main">{body}</div>
+{script}
+</body></html>"""
+
+_AVATAR = '<img class="shopee-avatar__img" src="data:," alt="">'
+
+_LOGIN = """<form method="post" action="/buyer/login">
+<input name="loginKey" placeholder="Email/Phone/Username">
+<input name="password" type="password">
+<button type="submit">Log In</button>
+</form>"""
+
+_CARD = ('<li class="col-xs-2-4 shopee-search-item-result__item" data-sqe="item"><div class="h-full">'
+         '<a class="contents" href="/{slug}-i.{shop_id}.{item_id}?sp_atk=standin"><div class="p-2">'
+         '<div class="line-clamp-2 break-words min-w-0 min-h-[2.5rem] text-sm">{name}</div>'
+         '<div class="flex items-center justify-between space-x-1"><div class="truncate flex items-baseline">'
+         '<span class="text-xs/sp14 font-medium mr-px">₱</span><span class="font-medium text-base/5 truncate">{price}</span>'
+         '</div><div class="truncate text-shopee-black87 text-xs min-h-4">{sold} sold</div></div></div></a></div></li>')
+
+# Fetches the page's results from the API like the real site, so the
+# scraper's "api" mode sees a search_items response
+_API_SCRIPT = "<script>fetch('/api/v4/search/search_items?{query}').then(r => r.json());</script>"
+
+
+class StandInShop:
+    """Builds the stand-in's pages from the recorded search_items payload"""
+
+    def __init__(self, pages=10, require_login=False):
+        with open(os.path.join(FIXTURES, "search_items.json"), encoding="utf-8") as f:
+            self.items = json.load(f)['items']
+        self.pages = pages
+        self.require_login = require_login
+
+    def page_items(self, page_index):
+        if not 0 <= page_index < self.pages:
+            return []
+        items = []
+        for item in self.items:
+            basic = dict(item['item_basic'])
+            # Distinct ids per page, like real results
+            basic['itemid'] = basic['itemid'] * 100 + page_index
+            items.append({'item_basic': basic})
+        return items
+
+    def search_items(self, keyword, newest, limit=60):
+        page_index = newest // limit
+        items = self.page_items(page_index)
+        return {'error': None, 'total_count': len(self.items) * self.pages,
+                'nomore': page_index >= self.pages - 1, 'items': items}
+
+    def render(self, body, logged_in, keyword="", script=""):
+        avatar = _AVATAR if logged_in or not self.require_login else ""
+        return _PAGE.format(keyword=html.escape(keyword), avatar=avatar, body=body, script=script)
+
+    def search_page(self, keyword, page_index, logged_in):
+        cards = []
+        for item in self.page_items(page_index):
+            basic = item['item_basic']
+            cards.append(_CARD.format(
+                slug="-".join(basic['name'].split()),
+                shop_id=basic['shopid'],
+                item_id=basic['itemid'],
+                name=html.escape(basic['name']),
+                price=f"{basic['price_min'] // 100000:,}",
+                sold=f"{basic['historical_sold']:,}",
+            ))
+
+        next_url = "/search?" + urlencode({'keyword': keyword, 'page': page_index + 1, 'sortBy': 'sales'})
+        disabled = " disabled" if page_index >= self.pages - 1 else ""
+        body = (f'<button onclick="location.href=\'/search?{urlencode({"keyword": keyword, "page": page_index, "sortBy": "sales"})}\'">Top Sales</button>'
+                f'<ul class="row shopee-search-item-result__items">{"".join(cards)}</ul>'
+                f'<button class="shopee-icon-button shopee-icon-button--right"{disabled} '
+                f'onclick="location.href=\'{next_url}\'">&gt;</button>')
+        script = _API_SCRIPT.format(query=urlencode({'by': 'sales', 'keyword': keyword, 'limit': 60,
+                                                     'newest': page_index * 60}))
+        return self.render(body, logged_in, keyword, script)
+
+
+def _handler(shop):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _logged_in(self):
+            return SESSION_COOKIE in (self.headers.get('Cookie') or '')
+
+        def _send(self, status, body, content_type="text/html; charset=utf-8", headers=()):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == "/":
+                self._send(200, shop.render("", self._logged_in()))
+            elif url.path == "/buyer/login":
+                self._send(200, shop.render(_LOGIN, self._logged_in()))
+            elif url.path == "/search":
+                page_index = int(query.get('page', 0))
+                self._send(200, shop.search_page(query.get('keyword', ''), page_index, self._logged_in()))
+            elif url.path == "/api/v4/search/search_items":
+                payload = shop.search_items(query.get('keyword', ''), int(query.get('newest', 0)),
+                                            int(query.get('limit', 60)))
+                self._send(200, json.dumps(payload), "application/json")
+            else:
+                self._send(404, "Not found", "text/plain")
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/buyer/login":
+                self._send(404, "Not found", "text/plain")
+                return
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self.send_response(302)
+            self.send_header("Location", "/")
+            self.send_header("Set-Cookie", f"{SESSION_COOKIE}; Path=/")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    return Handler
+
+
+class StandInServer:
+    """Runs the stand-in on a background thread; port 0 picks a free port"""
+
+    def __init__(self, port=0, pages=10, require_login=False):
+        self.shop = StandInShop(pages, require_login)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _handler(self.shop))
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local Shopee stand-in")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pages', type=int, default=10, help="result pages per keyword")
+    parser.add_argument('--require-login', action='store_true', help="hide the avatar until the login form is posted")
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, args.pages, args.require_login)
+    print(f"Serving the Shopee stand-in at {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
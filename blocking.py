@@ -0,0 +1,99 @@
+from collections import Counter
+from urllib.parse import urlparse
+from config import *
+
+# Typical transfer sizes, used only to estimate what blocked requests would
+# have cost; the body of a request that is never sent cannot be measured.
+_ESTIMATED_BYTES = {
+    'image': 40_000,
+    'media': 500_000,
+    'font': 60_000,
+    'script': 80_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+_DEFAULT_ESTIMATE = 10_000
+
+# Playwright resource type names that CDP spells differently
+_CDP_RESOURCE_TYPES = {'xhr': 'XHR', 'texttrack': 'TextTrack', 'eventsource': 'EventSource',
+                       'websocket': 'WebSocket', 'cspviolationreport': 'CSPViolationReport'}
+
+
+class ResourceBlocker:
+    """Fails requests the scraper does not need and counts them.
+
+    Attach it to each page with attach() (sync API) or attach_async()
+    (async API). Blocking goes through the page's CDP Fetch domain with
+    patterns for just the blocked resource types and hosts, so everything
+    else is never intercepted and keeps using the HTTP cache (Playwright's
+    route() turns the cache off for the whole context). Anything matching
+    an allowlist pattern is still let through, e.g. CAPTCHA images the user
+    has to see. Needs a Chromium-based browser.
+    """
+
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, hosts=BLOCKED_HOSTS,
+                 allowlist=ALLOWED_URL_PATTERNS):
+        self.resource_types = set(resource_types)
+        self.hosts = tuple(hosts)
+        self.allowlist = tuple(allowlist)
+        self.reset()
+
+    def reset(self):
+        self.blocked = Counter()
+        self.estimated_bytes_saved = 0
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+
+    def should_block(self, url, resource_type):
+        if any(pattern in url for pattern in self.allowlist):
+            return False
+        if resource_type in self.resource_types:
+            return True
+        host = urlparse(url).hostname or ''
+        return any(host == blocked or host.endswith('.' + blocked) for blocked in self.hosts)
+
+    def fetch_patterns(self):
+        """Fetch.enable patterns covering every request should_block() may refuse"""
+        patterns = [{'urlPattern': '*', 'resourceType': _CDP_RESOURCE_TYPES.get(resource_type,
+                                                                                  resource_type.capitalize())}
+                    for resource_type in sorted(self.resource_types)]
+        for host in self.hosts:
+            patterns.append({'urlPattern': f'*://{host}/*'})
+            patterns.append({'urlPattern': f'*://*.{host}/*'})
+        return patterns
+
+    def _decide(self, event):
+        url = event['request']['url']
+        resource_type = event.get('resourceType', 'Other').lower()
+        if self.should_block(url, resource_type):
+            self.blocked[resource_type] += 1
+            self.estimated_bytes_saved += _ESTIMATED_BYTES.get(resource_type, _DEFAULT_ESTIMATE)
+            return 'Fetch.failRequest', {'requestId': event['requestId'], 'errorReason': 'BlockedByClient'}
+        return 'Fetch.continueRequest', {'requestId': event['requestId']}
+
+    def _count_response(self, response):
+        self.allowed_requests += 1
+        self.allowed_bytes += int(response.headers.get('content-length') or 0)
+
+    def attach(self, page):
+        cdp = page.context.new_cdp_session(page)
+        cdp.on("Fetch.requestPaused", lambda event: cdp.send(*self._decide(event)))
+        cdp.send("Fetch.enable", {'patterns': self.fetch_patterns()})
+        page.on("response", self._count_response)
+
+    async def attach_async(self, page):
+        cdp = await page.context.new_cdp_session(page)
+
+        async def on_paused(event):
+            await cdp.send(*self._decide(event))
+
+        cdp.on("Fetch.requestPaused", on_paused)
+        await cdp.send("Fetch.enable", {'patterns': self.fetch_patterns()})
+        page.on("response", self._count_response)
+
+    def summary(self):
+        blocked = sum(self.blocked.values())
+        by_type = ", ".join(f"{count} {resource_type}" for resource_type, count in self.blocked.most_common())
+        return (f"Blocked {blocked} requests ({by_type or 'none'}), "
+                f"roughly {self.estimated_bytes_saved / 1e6:.1f} MB by typical sizes (estimated, not measured); "
+                f"loaded {self.allowed_requests} requests, {self.allowed_bytes / 1e6:.1f} MB with known size")
@@ -0,0 +1,174 @@
+import queue
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlencode
+from playwright.sync_api import sync_playwright
+from blocking import ResourceBlocker
+from config import *
+from session import SessionManager
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+LOCALE = "en-US,en;q=0.9"
+
+
+def launch_options(user_agent=USER_AGENT, locale=LOCALE, headless=HEADLESS, channel=BROWSER_CHANNEL):
+    """Keyword arguments for chromium.launch, shared by the sync and async APIs"""
+    options = dict(
+        headless=headless,
+        args=[
+            f'--user-agent={user_agent}',
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-blink-features=AutomationControlled',
+            f'--lang={locale.split(",")[0]}',
+            '--start-maximized'
+        ],
+        chromium_sandbox=False,
+        ignore_default_args=["--enable-automation"]
+    )
+    if channel:
+        options['channel'] = channel
+    return options
+
+
+def launch_browser(playwright, user_agent=USER_AGENT, locale=LOCALE, headless=HEADLESS, channel=BROWSER_CHANNEL):
+    return playwright.chromium.launch(**launch_options(user_agent, locale, headless, channel))
+
+
+def search_url(keyword, page_index=0, base_url=BASE_URL):
+    """URL of one page of Top Sales results; page_index starts at 0"""
+    return f"{base_url}/search?" + urlencode({'keyword': keyword, 'page': page_index, 'sortBy': 'sales'})
+
+
+class BrowserService:
+    """Keeps one browser and logged-in context alive across scrapes.
+
+    Playwright's sync API can only be used from the thread that started it,
+    so all browser work runs on one worker thread; callers hand it functions
+    through run() and block until they finish.
+    """
+
+    def __init__(self, max_pages=MAX_TABS, storage_state_file=STORAGE_STATE_FILE, headless=HEADLESS):
+        self.max_pages = max_pages
+        self.headless = headless
+        self.session = SessionManager(storage_state_file)
+        self.logged_in = False
+        self.blocker = ResourceBlocker() if BLOCK_RESOURCES else None
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self._idle_pages = []
+        self._busy_pages = set()
+        self._tasks = queue.Queue()
+        self._thread = None
+        self._reset_requested = False
+
+    def run(self, func, *args):
+        """Run func(*args) on the browser thread and return its result"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+        future = Future()
+        self._tasks.put((func, args, future))
+        return future.result()
+
+    def _worker(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            func, args, future = task
+            try:
+                self._ensure_browser()
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._release_all_pages()
+        self._shutdown()
+
+    def _ensure_browser(self):
+        if self.browser is not None and self.browser.is_connected():
+            if self._reset_requested:
+                self._reset_context()
+            return
+        self._reset_requested = False
+        if self.browser is not None:
+            print("Browser session died, relaunching...")
+            self._shutdown()
+
+        self.playwright = sync_playwright().start()
+        self.browser = launch_browser(self.playwright, headless=self.headless)
+        self._new_context(self.session.state())
+        print("Browser started")
+
+    def _new_context(self, storage_state=None):
+        self.context = self.browser.new_context(storage_state=storage_state)
+
+    def _shutdown(self):
+        try:
+            if self.browser is not None:
+                self.browser.close()
+            if self.playwright is not None:
+                self.playwright.stop()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.logged_in = False
+        self._idle_pages = []
+        self._busy_pages = set()
+
+    def acquire_page(self):
+        """Hand out an open page, reusing an idle one when possible (browser thread only)"""
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.is_closed():
+                self._busy_pages.add(page)
+                return page
+        if len(self._busy_pages) >= self.max_pages:
+            raise RuntimeError(f"All {self.max_pages} browser pages are in use")
+        page = self.context.new_page()
+        if self.blocker is not None:
+            self.blocker.attach(page)
+        self._busy_pages.add(page)
+        return page
+
+    def release_page(self, page):
+        self._busy_pages.discard(page)
+        if not page.is_closed():
+            self._idle_pages.append(page)
+
+    def _release_all_pages(self):
+        for page in list(self._busy_pages):
+            self.release_page(page)
+
+    def mark_logged_in(self):
+        """Remember that the context is logged in; ShopeeScraper saves its state"""
+        self.logged_in = True
+
+    def reset_session(self):
+        """Drop the logged-in context, e.g. after the user deleted cookies.
+
+        Safe to call from the Tk thread: it never waits for the browser
+        thread (which may be mid-scrape and itself waiting on Tk). The
+        context is replaced before the next task runs.
+        """
+        self._reset_requested = True
+        self.logged_in = False
+
+    def _reset_context(self):
+        self._reset_requested = False
+        if self.context is not None:
+            self.context.close()
+        self._idle_pages = []
+        self._busy_pages = set()
+        self._new_context()
+        self.logged_in = False
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._tasks.put(None)
+            self._thread.join(timeout=10)
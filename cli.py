@@ -0,0 +1,101 @@
+"""Scrape a list of keywords without the GUI, e.g. from cron on a headless server.
+
+Usage: python -m cli keywords.txt [--pages 3] [--concurrency 3] [--db shopee_products.db]
+
+The keyword file has one keyword per line; blank lines and lines starting
+with # are skipped, and - reads the keywords from stdin. The saved login
+(STORAGE_STATE_FILE or COOKIE_FILE) is reused, so log in once with the GUI
+and copy the file over.
+"""
+import argparse
+import asyncio
+import shlex
+import subprocess
+import sys
+import time
+from async_scraper import AsyncScrapeEngine
+from config import *
+from metrics import metrics, profiled
+
+
+def read_keywords(path):
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        keywords = [line.strip() for line in f]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    # Keep the file's order but scrape each keyword once
+    return list(dict.fromkeys(k for k in keywords if k and not k.startswith('#')))
+
+
+def captcha_reporter(command=None):
+    """Return an on_captcha callback that logs the URL and optionally runs command URL"""
+    def on_captcha(url):
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} CAPTCHA at {url}", file=sys.stderr)
+        if command:
+            try:
+                subprocess.run(shlex.split(command) + [url], timeout=30)
+            except (OSError, subprocess.SubprocessError) as e:
+                print(f"Error running CAPTCHA command: {e}", file=sys.stderr)
+    return on_captcha
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Scrape Shopee search results into SQLite")
+    parser.add_argument('keyword_file', help="file with one keyword per line, or - for stdin")
+    parser.add_argument('--pages', type=int, default=3, help="result pages per keyword (default: 3)")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help=f"pages loading at the same time (default: {CONCURRENCY})")
+    parser.add_argument('--contexts', type=int, default=BROWSER_CONTEXTS,
+                        help=f"browser contexts, i.e. keywords in flight (default: {BROWSER_CONTEXTS})")
+    parser.add_argument('--db', default=DB_NAME, help=f"output SQLite database (default: {DB_NAME})")
+    parser.add_argument('--storage-state', default=STORAGE_STATE_FILE,
+                        help=f"saved login state (default: {STORAGE_STATE_FILE})")
+    parser.add_argument('--channel', default=None,
+                        help="browser channel such as msedge or chrome (default: bundled Chromium)")
+    parser.add_argument('--headed', action='store_true', help="show the browser window")
+    parser.add_argument('--resume', action='store_true', help="continue unfinished runs where they stopped")
+    parser.add_argument('--captcha-timeout', type=int, default=0,
+                        help="seconds to wait for a CAPTCHA to be solved before giving up on the keyword "
+                             "(default: 0, nobody can solve it headless)")
+    parser.add_argument('--captcha-command',
+                        help="command run with the page URL as last argument when a CAPTCHA shows up")
+    parser.add_argument('--metrics', default=METRICS_FILE, help="append span events and counters to this JSON-lines file")
+    parser.add_argument('--prometheus', default=PROMETHEUS_FILE,
+                        help="write counters and histograms to this file in Prometheus text format")
+    parser.add_argument('--profile', default=PROFILE_FILE, help="profile the run with cProfile into this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    keywords = read_keywords(args.keyword_file)
+    if not keywords:
+        print("No keywords to scrape", file=sys.stderr)
+        return 2
+
+    engine = AsyncScrapeEngine(db_name=args.db, contexts=args.contexts, concurrency=args.concurrency,
+                               headless=not args.headed, channel=args.channel,
+                               storage_state_file=args.storage_state, captcha_timeout=args.captcha_timeout,
+                               on_captcha=captcha_reporter(args.captcha_command))
+
+    start = time.perf_counter()
+    try:
+        with profiled(args.profile):
+            counts = asyncio.run(engine.run(keywords, args.pages, args.resume))
+    finally:
+        metrics.export(args.metrics, args.prometheus)
+    elapsed = time.perf_counter() - start
+
+    items = sum(counts.values())
+    print(f"\n{len(keywords)} keywords, {engine.pages_stored} pages, {items} items in {elapsed:.1f}s "
+          f"({engine.pages_stored / elapsed:.2f} pages/s, {items / elapsed:.1f} items/s)")
+    if engine.failed:
+        print(f"Failed: {', '.join(engine.failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,104 @@
 COOKIE_FILE = "shopee_cookies.json"
-DB_NAME = "shopee_products.db"
\ No newline at end of file
+DB_NAME = "shopee_products.db"
+STORAGE_STATE_FILE = "shopee_storage_state.json"
+BASE_URL = "https://shopee.ph"
+
+# A saved login verified less than this many seconds ago is used without
+# loading the homepage to check it; it is checked again as soon as a search
+# gets redirected to the login page
+SESSION_TTL = 6 * 60 * 60
+
+# "api" reads products from Shopee's search API responses and falls back to
+# in-page extraction when none is captured; "js" always extracts the cards
+# inside the page; "dom" downloads the whole page and parses it in Python.
+EXTRACTION_MODE = "api"
+
+# "url" opens result pages directly by URL, up to MAX_TABS at a time in
+# parallel tabs; "click" types the keyword and clicks through the pages
+NAVIGATION_MODE = "url"
+MAX_TABS = 4
+
+# Scrolling stops once every card has its price loaded, or the card counts
+# have not changed for SCROLL_STABLE_CHECKS scrolls, or after MAX_SCROLLS
+MAX_SCROLLS = 6
+SCROLL_STABLE_CHECKS = 2
+SCROLL_DELAY = (0.5, 1.5)
+
+# Requests the scraper never needs are failed: these resource types and
+# any host ending in one of BLOCKED_HOSTS. URLs containing an
+# ALLOWED_URL_PATTERNS entry are always loaded (CAPTCHA images, search API).
+# Other requests are not intercepted, so they keep using the HTTP cache.
+BLOCK_RESOURCES = True
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "facebook.net",
+    "facebook.com",
+    "analytics.tiktok.com",
+    "criteo.com",
+    "criteo.net",
+    "appsflyer.com",
+    "hotjar.com",
+    "clarity.ms",
+    "scorecardresearch.com",
+)
+ALLOWED_URL_PATTERNS = ("captcha", "/verify/", "/api/v4/search/")
+
+# HTML parser used by the "dom" extraction mode: "bs4", "lxml" (needs lxml and
+# cssselect) or "selectolax" (needs selectolax)
+HTML_PARSER = "bs4"
+
+# Multi-keyword scraping: browser contexts sharing the saved login, pages
+# loading at the same time, and minimum seconds between two navigations
+# to the same host
+BROWSER_CONTEXTS = 2
+CONCURRENCY = 3
+PAGE_INTERVAL = 2.0
+# Every thread gets its own SQLite connection; each keeps up to this many
+# prepared statements so repeated queries skip re-parsing the SQL
+CACHED_STATEMENTS = 256
+
+# Browser used for scraping: a Playwright channel such as "msedge" or
+# "chrome", or None for Playwright's bundled Chromium (what Linux servers
+# without Edge need). HEADLESS hides the browser window.
+BROWSER_CHANNEL = "msedge"
+HEADLESS = False
+
+# Metrics: span events are appended to METRICS_FILE (JSON lines) and all
+# counters/histograms written to PROMETHEUS_FILE after each scrape; with
+# PROFILE_FILE set, every scrape is profiled with cProfile into that file.
+# None turns each off.
+METRICS_FILE = None
+PROMETHEUS_FILE = None
+PROFILE_FILE = None
+
+# Random pauses that make the browser look like a person (typing, clicks,
+# scrolling). Only turn them off against a local stand-in server.
+HUMAN_DELAYS = True
+
+# Exports read this many rows from SQLite at a time; Parquet files get row
+# groups of EXPORT_ROW_GROUP_SIZE rows
+EXPORT_BATCH_SIZE = 5000
+EXPORT_ROW_GROUP_SIZE = 100000
+
+# Job queue (python -m worker): a worker holds a job for JOB_LEASE_SECONDS
+# and renews the lease while it scrapes, so a crashed worker's job goes back
+# to the queue once the lease runs out. A job is tried JOB_MAX_ATTEMPTS
+# times; idle workers check for new jobs every JOB_POLL_INTERVAL seconds.
+JOB_LEASE_SECONDS = 120
+JOB_MAX_ATTEMPTS = 3
+JOB_POLL_INTERVAL = 5
+# A worker that stores no page for JOB_STALL_SECONDS (plus its CAPTCHA
+# timeout) is taken to be hung: it stops renewing and the job is retried
+JOB_STALL_SECONDS = 600
+
+# Coordinator (python -m coordinator) for workers on other machines. With
+# a token set, workers must send the same one (python -m worker --token).
+# Listening on anything but loopback requires a token.
+COORDINATOR_HOST = "127.0.0.1"
+COORDINATOR_PORT = 8765
+COORDINATOR_TOKEN = None
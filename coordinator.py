@@ -0,0 +1,162 @@
+"""Serve the job queue and result storage to workers on other machines.
+
+Usage: python -m coordinator [--host 127.0.0.1] [--port 8765] [--db shopee_products.db] [--token SECRET]
+
+Runs next to the database. Workers elsewhere start with
+python -m worker --coordinator http://<host>:8765 and lease jobs, renew
+their leases and store result pages through it, so only this process
+touches the SQLite file. Requests are JSON over HTTP: POST /<method> with
+{"args": [...], "kwargs": {...}} calls that DatabaseManager method and
+answers {"result": ...}. Only the methods in METHODS can be called; with a token,
+requests must also carry it as "Authorization: Bearer <token>".
+
+It listens on 127.0.0.1 by default. Anyone who can reach it can write to
+the database, so it will not listen on any other address without a token.
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import sqlite3
+import sys
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import *
+from database import shared_database
+
+# What a worker needs: the queue, plus storing a run page by page
+METHODS = ('lease_job', 'renew_lease', 'finish_job', 'release_job', 'enqueue_job', 'get_jobs',
+           'start_run', 'insert_page', 'finish_run', 'get_resumable_run')
+
+# What DatabaseManager returns when the call fails, for the methods where
+# that is not None
+_ON_ERROR = {'renew_lease': False, 'insert_page': 0, 'get_jobs': []}
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    db = None
+    token = None
+
+    def do_POST(self):
+        method = self.path.strip('/')
+        if self.token and not hmac.compare_digest(self.headers.get('Authorization', ''), f"Bearer {self.token}"):
+            return self._reply(401, {'error': "bad or missing token"})
+        if method not in METHODS:
+            return self._reply(404, {'error': f"unknown method '{method}'"})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            call = json.loads(self.rfile.read(length) or b'{}')
+            result = getattr(self.db, method)(*call.get('args', []), **call.get('kwargs', {}))
+        except (ValueError, TypeError, sqlite3.Error) as e:
+            return self._reply(400, {'error': str(e)})
+        finally:
+            # Every request runs on a new thread; don't leave its connection open
+            self.db.close_thread()
+        self._reply(200, {'result': result})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Leases are renewed every few seconds; only log failures
+        if len(args) > 1 and str(args[1]) == '200':
+            return
+        super().log_message(format, *args)
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_server(db_name=DB_NAME, host=COORDINATOR_HOST, port=COORDINATOR_PORT, token=COORDINATOR_TOKEN):
+    """Build the coordinator's HTTP server; raises ValueError for a
+    non-loopback host without a token"""
+    if not token and not is_loopback(host):
+        raise ValueError(f"Refusing to serve the database on {host} without a token; pass --token")
+    handler = type('Handler', (CoordinatorHandler,), {'db': shared_database(db_name), 'token': token})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class RemoteDatabase:
+    """The worker's side of the coordinator.
+
+    Has the DatabaseManager methods in METHODS, each a request to the
+    coordinator at url. Like DatabaseManager, a failed call prints the
+    error and returns what DatabaseManager would on an error (None, 0,
+    False or []), so a worker that cannot reach the coordinator treats its
+    lease as lost and stops.
+    """
+
+    def __init__(self, url, token=COORDINATOR_TOKEN, timeout=30):
+        self.url = url.rstrip('/')
+        self.db_name = self.url
+        self.token = token
+        self.timeout = timeout
+
+    def _call(self, method, *args, **kwargs):
+        data = json.dumps({'args': args, 'kwargs': kwargs}).encode('utf-8')
+        request = urllib.request.Request(f"{self.url}/{method}", data=data, headers={'Content-Type': 'application/json'})
+        if self.token:
+            request.add_header('Authorization', f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)['result']
+        except urllib.error.HTTPError as e:
+            print(f"Coordinator refused {method}: {e.read().decode('utf-8', 'replace')}")
+        except (OSError, ValueError) as e:
+            print(f"Error calling {method} on {self.url}: {e}")
+        return _ON_ERROR.get(method)
+
+    def __getattr__(self, name):
+        if name not in METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def close_thread(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m coordinator",
+                                     description="Serve the job queue to workers on other machines")
+    parser.add_argument('--host', default=COORDINATOR_HOST,
+                        help=f"address to listen on; anything but loopback needs --token (default: {COORDINATOR_HOST})")
+    parser.add_argument('--port', type=int, default=COORDINATOR_PORT, help=f"port (default: {COORDINATOR_PORT})")
+    parser.add_argument('--db', default=DB_NAME, help=f"SQLite database holding the queue (default: {DB_NAME})")
+    parser.add_argument('--token', default=COORDINATOR_TOKEN, help="shared secret workers must send")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        server = make_server(args.db, args.host, args.port, args.token)
+    except (ValueError, OSError) as e:
+        print(f"Error starting coordinator: {e}", file=sys.stderr)
+        return 1
+    print(f"Coordinator for {args.db} listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
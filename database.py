@@ -1,130 +1,979 @@
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import *
+from metrics import metrics
+
+# A k/M suffix counts only as a word of its own ("1.2k+", "3 M"), never as
+# the first letter of the next word ("12 monthly sold")
+_NUMBER_RE = re.compile(r'(\d[\d,]*(?:\.\d+)?)(?:\s*([kKmM])(?![A-Za-z]))?')
+_MULTIPLIERS = {'': 1, 'k': 1000, 'm': 1000000}
+_WORD_RE = re.compile(r'\w+')
+_ITEM_ID_RES = (
+    re.compile(r'-i\.(\d+)\.(\d+)'),
+    re.compile(r'/product/(\d+)/(\d+)'),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keywords (
+    id INTEGER PRIMARY KEY,
+    keyword TEXT NOT NULL UNIQUE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- Bumped by every write to this keyword's runs, so readers can tell
+    -- whether results they cached are still current
+    data_version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS scrape_runs (
+    id INTEGER PRIMARY KEY,
+    keyword_id INTEGER NOT NULL REFERENCES keywords(id),
+    status TEXT NOT NULL DEFAULT 'running',
+    items INTEGER NOT NULL DEFAULT 0,
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_scrape_runs_keyword ON scrape_runs (keyword_id, id);
+
+-- One row per Shopee item; id is Shopee's own item id, which is unique
+-- across shops. The price and sold columns hold the latest values seen;
+-- a scrape only rewrites a row when one of them changed.
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    shop_id INTEGER,
+    name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+    price TEXT,
+    sold TEXT,
+    price_min INTEGER,
+    price_max INTEGER,
+    sold_count INTEGER,
+    updated_run_id INTEGER REFERENCES scrape_runs(id),
+    updated_at DATETIME
+);
+
+-- Full-text index over product names, kept in step with products by the
+-- triggers below; prefix indexes make short prefix queries cheap. Not
+-- named products_* so the legacy table import leaves it alone.
+CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+    name, content='products', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS products_search_insert AFTER INSERT ON products BEGIN
+    INSERT INTO product_search (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_search_delete AFTER DELETE ON products BEGIN
+    INSERT INTO product_search (product_search, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_search_update AFTER UPDATE OF name ON products
+WHEN old.name IS NOT new.name BEGIN
+    INSERT INTO product_search (product_search, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO product_search (rowid, name) VALUES (new.id, new.name);
+END;
+
+-- Append-only history: every run adds one row per item it saw, which is
+-- also what lists a run's results
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    run_id INTEGER NOT NULL REFERENCES scrape_runs(id),
+    price TEXT NOT NULL,
+    sold TEXT NOT NULL,
+    price_min INTEGER,
+    price_max INTEGER,
+    sold_count INTEGER NOT NULL,
+    ts DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_observations_product ON observations (product_id, ts);
+CREATE INDEX IF NOT EXISTS idx_observations_run ON observations (run_id);
+CREATE INDEX IF NOT EXISTS idx_observations_price_asc ON observations (run_id, price_min ASC, sold_count DESC);
+CREATE INDEX IF NOT EXISTS idx_observations_price_desc ON observations (run_id, price_max DESC, sold_count DESC);
+CREATE INDEX IF NOT EXISTS idx_observations_sold_desc ON observations (run_id, sold_count DESC, price_min ASC);
+CREATE INDEX IF NOT EXISTS idx_observations_sold_asc ON observations (run_id, sold_count ASC, price_min ASC);
+
+-- Per item and day (UTC): lowest, highest and last price, and the sold
+-- count at the first and last observation. Prices are each observation's
+-- price_min in centavos. Updated from a run's observations when it
+-- finishes, so trend queries never aggregate the raw history.
+CREATE TABLE IF NOT EXISTS daily_prices (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    day DATE NOT NULL,
+    min_price INTEGER NOT NULL,
+    max_price INTEGER NOT NULL,
+    last_price INTEGER NOT NULL,
+    first_sold INTEGER NOT NULL,
+    last_sold INTEGER NOT NULL,
+    first_ts DATETIME NOT NULL,
+    last_ts DATETIME NOT NULL,
+    PRIMARY KEY (product_id, day)
+) WITHOUT ROWID;
+
+-- Searches waiting for a worker process (worker.py). A worker owns a
+-- running job until lease_expires (unix time) and keeps pushing that out
+-- while it works; a job whose lease ran out is back up for grabs.
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    keyword TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    items INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, id);
+
+-- Checkpoint per results page stored by a run, so a failed run can resume
+CREATE TABLE IF NOT EXISTS run_pages (
+    run_id INTEGER NOT NULL REFERENCES scrape_runs(id),
+    page_index INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    cursor_url TEXT,
+    completed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, page_index)
+);
+"""
+
+# Sort key columns per sort option. Each has a matching (run_id, ...) index
+# above, which ends in the rowid, so reading one run in any order is an
+# index range scan with no sort step, and the key is unique for keyset paging.
+_SORT_KEYS = {
+    'price_low_to_high': (('o.price_min', 'ASC'), ('o.sold_count', 'DESC'), ('o.id', 'ASC')),
+    'price_high_to_low': (('o.price_max', 'DESC'), ('o.sold_count', 'DESC'), ('o.id', 'ASC')),
+    'sold_high_to_low': (('o.sold_count', 'DESC'), ('o.price_min', 'ASC'), ('o.id', 'ASC')),
+    'sold_low_to_high': (('o.sold_count', 'ASC'), ('o.price_min', 'ASC'), ('o.id', 'ASC')),
+    'default': (('o.id', 'ASC'),),
+}
+
+
+def _order_by(sort_option):
+    keys = _SORT_KEYS.get(sort_option, _SORT_KEYS['default'])
+    return ", ".join(f"{column} {direction}" for column, direction in keys)
+
+
+def _keyset_filter(keys, after):
+    """WHERE clause selecting the rows that sort after the key `after`"""
+    def past(column, direction):
+        return f"{column} {'>' if direction == 'ASC' else '<'} ?"
+
+    clauses = []
+    params = []
+    for i, (column, direction) in enumerate(keys):
+        clauses.append("(" + " AND ".join([f"{c} = ?" for c, _ in keys[:i]] + [past(column, direction)]) + ")")
+        params.extend(after[:i + 1])
+
+    # The redundant bound on the first column lets SQLite start the index
+    # range at the bookmark instead of filtering from the top of the run
+    first_column, first_direction = keys[0]
+    bound = f"{first_column} {'>=' if first_direction == 'ASC' else '<='} ?"
+    return f"{bound} AND ({' OR '.join(clauses)})", [after[0]] + params
+
+# Latest-state columns added to products after the first release
+_PRODUCT_STATE_COLUMNS = (
+    ('price', 'TEXT'),
+    ('sold', 'TEXT'),
+    ('price_min', 'INTEGER'),
+    ('price_max', 'INTEGER'),
+    ('sold_count', 'INTEGER'),
+    ('updated_run_id', 'INTEGER REFERENCES scrape_runs(id)'),
+    ('updated_at', 'DATETIME'),
+)
+
+# WAL lets the GUI read while a scrape is writing; it is stored in the
+# database file, so it is set once. The rest only last for one connection.
+# NORMAL only fsyncs at checkpoints, which is safe in WAL mode. Negative
+# cache_size is in KiB.
+_DATABASE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+)
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    return " ".join(f'"{word}"*' for word in _WORD_RE.findall(text or ''))
+
+
+def _parse_numbers(text):
+    values = []
+    for number, suffix in _NUMBER_RE.findall(text or ''):
+        values.append(float(number.replace(',', '')) * _MULTIPLIERS[suffix.lower()])
+    return values
+
+
+def parse_price(text):
+    """Parse '₱1,299' or '₱100 - ₱250' into a (min, max) tuple of centavos"""
+    values = [int(round(value * 100)) for value in _parse_numbers(text)]
+    if not values:
+        return None, None
+    return min(values), max(values)
+
+
+def parse_sold(text):
+    """Parse '1.2K+ sold' or '1,234 sold/month' into an integer count"""
+    values = _parse_numbers(text)
+    return int(round(values[0])) if values else 0
+
+
+def parse_item_ids(link):
+    """Return (shop_id, item_id) from a Shopee product URL, or (None, None)"""
+    for pattern in _ITEM_ID_RES:
+        match = pattern.search(link or '')
+        if match:
+            return int(match.group(1)), int(match.group(2))
+    return None, None
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_database(db_name=DB_NAME):
+    """Return the process-wide DatabaseManager for db_name"""
+    with _shared_lock:
+        if db_name not in _shared:
+            _shared[db_name] = DatabaseManager(db_name)
+        return _shared[db_name]
+
 
 class DatabaseManager:
-    def __init__(self, db_name):
+    """Database access for any number of threads.
+
+    Each thread that uses the manager gets its own connection and cursor
+    (self.conn and self.cursor), opened on first use with the per-connection
+    PRAGMAs applied. The schema and migrations run once, when the manager is
+    created. Use shared_database() rather than creating managers per call.
+    """
+
+    def __init__(self, db_name, cached_statements=CACHED_STATEMENTS):
         self.db_name = db_name
-        self.conn = None
-        self.cursor = None
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
         self.connect()
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            self.cursor = self.conn.cursor()
+            for pragma in _DATABASE_PRAGMAS:
+                self.cursor.execute(pragma)
+            self.cursor.executescript(_SCHEMA)
+            self.migrate()
         except sqlite3.Error as e:
             print(f"Error connecting to SQLite Database: {e}")
 
-    def create_table(self, keyword):
-        # Replace spaces with underscores in table name
-        table_name = f"products_{keyword.replace(' ', '_')}"
-        query = f"""CREATE TABLE IF NOT EXISTS {table_name} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    price TEXT NOT NULL,
-                    sold TEXT NOT NULL,
-                    link TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                );"""
-        try:
-            self.cursor.execute(query)
-            self.conn.commit()
-            return table_name
-        except sqlite3.Error as e:
-            print(f"Error creating table: {e}")
+    def _open(self):
+        # Only the owning thread uses a connection; check_same_thread is off
+        # so close() can shut every connection down from one thread
+        conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        cursor = conn.cursor()
+        for pragma in _CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+        self._local.conn = conn
+        self._local.cursor = cursor
+        with self._lock:
+            self._connections.add(conn)
+
+    @property
+    def conn(self):
+        if getattr(self._local, 'conn', None) is None:
+            self._open()
+        return self._local.conn
+
+    @property
+    def cursor(self):
+        if getattr(self._local, 'cursor', None) is None:
+            self._open()
+        return self._local.cursor
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in one write transaction and yield this thread's cursor.
+
+        The transaction takes the write lock up front (BEGIN IMMEDIATE) so
+        two writers wait on busy_timeout instead of failing on upgrade.
+        Nested blocks join the outer transaction.
+        """
+        conn = self.conn
+        if conn.in_transaction:
+            yield self.cursor
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.cursor
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def migrate(self):
+        self.cursor.execute("PRAGMA table_info(keywords)")
+        if 'data_version' not in [row[1] for row in self.cursor.fetchall()]:
+            with self.transaction():
+                self.cursor.execute("ALTER TABLE keywords ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+
+        self.cursor.execute("PRAGMA table_info(products)")
+        columns = [row[1] for row in self.cursor.fetchall()]
+        missing = [(name, type_) for name, type_ in _PRODUCT_STATE_COLUMNS if name not in columns]
+        if missing:
+            with self.transaction():
+                for name, type_ in missing:
+                    self.cursor.execute(f"ALTER TABLE products ADD COLUMN {name} {type_}")
+                # Fill the latest state in from each item's newest observation
+                self.cursor.execute(
+                    """UPDATE products SET (price, sold, price_min, price_max, sold_count, updated_run_id, updated_at) =
+                           (SELECT price, sold, price_min, price_max, sold_count, run_id, ts FROM observations
+                            WHERE product_id = products.id ORDER BY ts DESC, id DESC LIMIT 1)"""
+                )
+
+        # An item is stored once per run; older databases may hold repeats
+        # from Shopee reordering results between pages.
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_observations_run_product'")
+        if not self.cursor.fetchone():
+            with self.transaction():
+                self.cursor.execute("""DELETE FROM observations WHERE id NOT IN
+                                       (SELECT MIN(id) FROM observations GROUP BY run_id, product_id)""")
+                self.cursor.execute("""UPDATE scrape_runs SET items =
+                                       (SELECT COUNT(*) FROM observations WHERE run_id = scrape_runs.id)""")
+                self.cursor.execute("CREATE UNIQUE INDEX idx_observations_run_product ON observations (run_id, product_id)")
+
+        # Version 1: the keyset pages need a price on every observation; rows
+        # from before prices were parsed at insert time have NULLs. Scans the
+        # whole table, so it runs once and the version is recorded with it.
+        self.cursor.execute("PRAGMA user_version")
+        if self.cursor.fetchone()[0] < 1:
+            with self.transaction():
+                self.cursor.execute("UPDATE observations SET price_min = 0, price_max = 0 WHERE price_min IS NULL")
+                self.cursor.execute("PRAGMA user_version = 1")
+
+        # Products stored before the search index existed
+        self.cursor.execute("""SELECT (SELECT COUNT(*) FROM products),
+                                      (SELECT COUNT(*) FROM product_search_docsize)""")
+        products, indexed = self.cursor.fetchone()
+        if products != indexed:
+            with self.transaction():
+                self.cursor.execute("INSERT INTO product_search (product_search) VALUES ('rebuild')")
+
+        # Observations stored before the daily rollups existed
+        self.cursor.execute("""SELECT EXISTS (SELECT 1 FROM observations),
+                                      EXISTS (SELECT 1 FROM daily_prices)""")
+        has_observations, has_rollups = self.cursor.fetchone()
+        if has_observations and not has_rollups:
+            with self.transaction():
+                self._roll_up()
+
+        # Import the old per-keyword products_<keyword> tables as one
+        # completed run each, then drop them. A table with rows that could
+        # not be imported (no item id in the link) is kept, renamed to
+        # legacy_products_<keyword> so it is not imported again.
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'products\\_%' ESCAPE '\\'")
+        for (table_name,) in self.cursor.fetchall():
+            keyword = table_name[len('products_'):].replace('_', ' ')
+            self.cursor.execute(f"SELECT name, price, sold, link, timestamp FROM {table_name} ORDER BY id")
+            rows = self.cursor.fetchall()
+            try:
+                with self.transaction():
+                    run_id = self._start_run(keyword)
+                    stored = self._insert_rows(run_id, [
+                        {'name': name, 'price': price, 'sold': sold, 'link': link, 'ts': timestamp}
+                        for name, price, sold, link, timestamp in rows
+                    ])
+                    self.cursor.execute(
+                        """UPDATE scrape_runs SET status = 'completed',
+                               started_at = (SELECT MIN(ts) FROM observations WHERE run_id = ?),
+                               finished_at = (SELECT MAX(ts) FROM observations WHERE run_id = ?)
+                           WHERE id = ?""",
+                        (run_id, run_id, run_id)
+                    )
+                    self._roll_up(run_id)
+                    if stored == len(rows):
+                        self.cursor.execute(f"DROP TABLE {table_name}")
+                    else:
+                        self.cursor.execute(f"ALTER TABLE {table_name} RENAME TO legacy_{table_name}")
+                print(f"Migrated {stored} of {len(rows)} rows from {table_name}")
+                if stored != len(rows):
+                    print(f"Kept {table_name} as legacy_{table_name} with all {len(rows)} rows")
+            except sqlite3.Error as e:
+                print(f"Error migrating table {table_name}: {e}")
+
+    def _keyword_id(self, keyword):
+        self.cursor.execute("INSERT OR IGNORE INTO keywords (keyword) VALUES (?)", (keyword,))
+        self.cursor.execute("SELECT id FROM keywords WHERE keyword = ?", (keyword,))
+        return self.cursor.fetchone()[0]
+
+    def _start_run(self, keyword):
+        self.cursor.execute("INSERT INTO scrape_runs (keyword_id) VALUES (?)", (self._keyword_id(keyword),))
+        return self.cursor.lastrowid
+
+    def start_run(self, keyword):
+        """Register a new scrape run for keyword and return its id"""
+        try:
+            with metrics.span('db.write', op='start_run'), self.transaction():
+                return self._start_run(keyword)
+        except sqlite3.Error as e:
+            print(f"Error starting run: {e}")
             return None
-        
-    def clear_table(self, table_name):
-        query = f"DELETE FROM {table_name}"
+
+    def finish_run(self, run_id, status='completed'):
         try:
-            self.cursor.execute(query)
-            self.conn.commit()
-            print(f"Cleared table: {table_name}")
-            return True
+            with metrics.span('db.write', op='finish_run'), self.transaction():
+                self.cursor.execute(
+                    "UPDATE scrape_runs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (status, run_id)
+                )
+                self._roll_up(run_id)
         except sqlite3.Error as e:
-            print(f"Error clearing table {table_name}: {e}")
-            return False
-        
-    def insert_product(self, table_name, product):
-        query = f"""INSERT INTO {table_name} (name, price, sold, link)
-                   VALUES (?, ?, ?, ?);"""
+            print(f"Error finishing run {run_id}: {e}")
+
+    def _roll_up(self, run_id=None):
+        """Fold one run's observations (or all of them) into daily_prices.
+
+        Every column is a min, max or latest-by-timestamp, so rolling up the
+        same run again (e.g. after a resume) changes nothing. Observations
+        without a price are left out.
+        """
+        where = "price_min > 0" + (" AND run_id = ?" if run_id is not None else "")
+        self.cursor.execute(
+            f"""INSERT INTO daily_prices (product_id, day, min_price, max_price, last_price,
+                                         first_sold, last_sold, first_ts, last_ts)
+                SELECT product_id, date(ts), price_min, price_min, price_min, sold_count, sold_count, ts, ts
+                FROM observations WHERE {where}
+                ON CONFLICT(product_id, day) DO UPDATE SET
+                    min_price = min(min_price, excluded.min_price),
+                    max_price = max(max_price, excluded.max_price),
+                    last_price = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_price ELSE last_price END,
+                    last_sold = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_sold ELSE last_sold END,
+                    last_ts = max(last_ts, excluded.last_ts),
+                    first_sold = CASE WHEN excluded.first_ts < first_ts THEN excluded.first_sold ELSE first_sold END,
+                    first_ts = min(first_ts, excluded.first_ts)""",
+            (run_id,) if run_id is not None else ()
+        )
+
+    def _insert_rows(self, run_id, products):
+        product_rows = []
+        observation_rows = []
+        for product in products:
+            shop_id, item_id = product.get('shop_id'), product.get('item_id')
+            if item_id is None:
+                shop_id, item_id = parse_item_ids(product['link'])
+            if item_id is None:
+                print(f"Skipping product without an item id: {product['link']}")
+                continue
+            # API records already carry exact numbers; DOM records only have text
+            if 'price_min' in product:
+                price_min, price_max = product['price_min'], product['price_max']
+            else:
+                price_min, price_max = parse_price(product['price'])
+            sold_count = product['sold_count'] if 'sold_count' in product else parse_sold(product['sold'])
+            # Unparseable prices sort as zero; keyset paging needs non-NULL keys
+            price_min, price_max = price_min or 0, price_max or 0
+            product_rows.append((item_id, shop_id, product['name'], product['link'], product['price'],
+                                 product['sold'], price_min, price_max, sold_count, run_id, product.get('ts')))
+            observation_rows.append((item_id, run_id, product['price'], product['sold'],
+                                     price_min, price_max, sold_count, product.get('ts')))
+
+        # Only rows whose details changed are rewritten, and older data (e.g.
+        # an imported legacy table) never replaces newer
+        self.cursor.executemany(
+            """INSERT INTO products (id, shop_id, name, link, price, sold, price_min, price_max, sold_count,
+                                   updated_run_id, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+               ON CONFLICT(id) DO UPDATE SET shop_id = excluded.shop_id,
+                                             name = excluded.name,
+                                             link = excluded.link,
+                                             price = excluded.price,
+                                             sold = excluded.sold,
+                                             price_min = excluded.price_min,
+                                             price_max = excluded.price_max,
+                                             sold_count = excluded.sold_count,
+                                             updated_run_id = excluded.updated_run_id,
+                                             updated_at = excluded.updated_at
+               WHERE (products.updated_at IS NULL OR excluded.updated_at >= products.updated_at)
+                 AND (products.price_min IS NOT excluded.price_min OR products.price_max IS NOT excluded.price_max
+                      OR products.sold_count IS NOT excluded.sold_count OR products.name IS NOT excluded.name
+                      OR products.shop_id IS NOT excluded.shop_id OR products.link IS NOT excluded.link)""",
+            product_rows
+        )
+        metrics.incr('db_products_written_total', self.cursor.rowcount)
+        # Items already stored for this run (a resumed page, or a product
+        # Shopee showed on two pages) are skipped
+        self.cursor.executemany(
+            """INSERT OR IGNORE INTO observations
+                   (product_id, run_id, price, sold, price_min, price_max, sold_count, ts)
+               VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))""",
+            observation_rows
+        )
+        inserted = self.cursor.rowcount
+        self.cursor.execute("UPDATE scrape_runs SET items = items + ? WHERE id = ?", (inserted, run_id))
+        if inserted:
+            self.cursor.execute("""UPDATE keywords SET data_version = data_version + 1
+                                   WHERE id = (SELECT keyword_id FROM scrape_runs WHERE id = ?)""", (run_id,))
+        return inserted
+
+    def insert_product(self, run_id, product):
+        return self.insert_products(run_id, [product])
+
+    def insert_products(self, run_id, products):
+        """Insert many products in a single transaction and return the row count"""
         try:
-            self.cursor.execute(query, (product['name'], product['price'], product['sold'], product['link']))
-            self.conn.commit()
+            with metrics.span('db.write', op='insert_products'), self.transaction():
+                inserted = self._insert_rows(run_id, products)
+            metrics.incr('db_rows_inserted_total', inserted)
+            return inserted
         except sqlite3.Error as e:
-            print(f"Error inserting product: {e}")
+            print(f"Error inserting products: {e}")
+            return 0
 
-    def get_products(self, table_name, sort_option='default'):
-        base_query = f"""SELECT name, price, sold, link FROM {table_name}"""
-        
-        if sort_option == 'price_low_to_high':
-            base_query += """
-                ORDER BY 
-                    CAST(REPLACE(REPLACE(price, '₱', ''), ',', '') AS REAL) ASC,
-                    CASE 
-                        WHEN sold LIKE '%K%' THEN 
-                            CAST(REPLACE(REPLACE(REPLACE(sold, ' sold/month', ''), 'K', ''), '+', '') AS REAL) * 1000
-                        WHEN sold LIKE '%+%' THEN 
-                            10000
-                        ELSE 
-                            CAST(REPLACE(REPLACE(sold, ' sold/month', ''), ',', '') AS INTEGER)
-                    END DESC"""
-        elif sort_option == 'price_high_to_low':
-            base_query += """
-                ORDER BY 
-                    CAST(REPLACE(REPLACE(price, '₱', ''), ',', '') AS REAL) DESC,
-                    CASE 
-                        WHEN sold LIKE '%K%' THEN 
-                            CAST(REPLACE(REPLACE(REPLACE(sold, ' sold/month', ''), 'K', ''), '+', '') AS REAL) * 1000
-                        WHEN sold LIKE '%+%' THEN 
-                            10000
-                        ELSE 
-                            CAST(REPLACE(REPLACE(sold, ' sold/month', ''), ',', '') AS INTEGER)
-                    END DESC"""
-        elif sort_option == 'sold_high_to_low':
-            base_query += """
-                ORDER BY 
-                    CASE 
-                        WHEN sold LIKE '%K%' THEN 
-                            CAST(REPLACE(REPLACE(REPLACE(sold, ' sold/month', ''), 'K', ''), '+', '') AS REAL) * 1000
-                        WHEN sold LIKE '%+%' THEN 
-                            10000
-                        ELSE 
-                            CAST(REPLACE(REPLACE(sold, ' sold/month', ''), ',', '') AS INTEGER)
-                    END DESC,
-                    CAST(REPLACE(REPLACE(price, '₱', ''), ',', '') AS REAL) ASC"""
-        elif sort_option == 'sold_low_to_high':
-            base_query += """
-                ORDER BY 
-                    CASE 
-                        WHEN sold LIKE '%K%' THEN 
-                            CAST(REPLACE(REPLACE(REPLACE(sold, ' sold/month', ''), 'K', ''), '+', '') AS REAL) * 1000
-                        WHEN sold LIKE '%+%' THEN 
-                            10000
-                        ELSE 
-                            CAST(REPLACE(REPLACE(sold, ' sold/month', ''), ',', '') AS INTEGER)
-                    END ASC,
-                    CAST(REPLACE(REPLACE(price, '₱', ''), ',', '') AS REAL) ASC"""
-        else:  # default
-            base_query += """ ORDER BY timestamp DESC"""
-            
-        try:
-            self.cursor.execute(base_query)
+    def insert_page(self, run_id, page_index, products, cursor_url=None):
+        """Store one results page and its checkpoint in a single transaction"""
+        try:
+            with metrics.span('db.write', op='insert_page'), self.transaction():
+                inserted = self._insert_rows(run_id, products)
+                self.cursor.execute(
+                    """INSERT OR REPLACE INTO run_pages (run_id, page_index, items, cursor_url)
+                       VALUES (?, ?, ?, ?)""",
+                    (run_id, page_index, inserted, cursor_url)
+                )
+            metrics.incr('db_rows_inserted_total', inserted)
+            return inserted
+        except sqlite3.Error as e:
+            print(f"Error storing page {page_index}: {e}")
+            return 0
+
+    def get_resumable_run(self, keyword):
+        """Return (run_id, first incomplete page) for keyword's latest run if it
+        did not complete, otherwise None"""
+        query = """SELECT r.id, r.status FROM scrape_runs r JOIN keywords k ON k.id = r.keyword_id
+                   WHERE k.keyword = ? ORDER BY r.id DESC LIMIT 1"""
+        try:
+            self.cursor.execute(query, (keyword,))
+            row = self.cursor.fetchone()
+            if row is None or row[1] == 'completed':
+                return None
+            run_id = row[0]
+
+            self.cursor.execute("SELECT page_index FROM run_pages WHERE run_id = ? ORDER BY page_index", (run_id,))
+            next_page = 1
+            for (page_index,) in self.cursor.fetchall():
+                if page_index != next_page:
+                    break
+                next_page += 1
+
+            with self.transaction():
+                self.cursor.execute("UPDATE scrape_runs SET status = 'running', finished_at = NULL WHERE id = ?",
+                                    (run_id,))
+            return run_id, next_page
+        except sqlite3.Error as e:
+            print(f"Error looking up resumable run: {e}")
+            return None
+
+    def get_latest_run(self, keyword):
+        query = """SELECT r.id FROM scrape_runs r JOIN keywords k ON k.id = r.keyword_id
+                   WHERE k.keyword = ? AND r.items > 0
+                   ORDER BY r.id DESC LIMIT 1"""
+        try:
+            self.cursor.execute(query, (keyword,))
+            row = self.cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Error retrieving latest run: {e}")
+            return None
+
+    def get_products(self, keyword, sort_option='default'):
+        """Return (name, price, sold, link) rows from the latest run for keyword"""
+        run_id = self.get_latest_run(keyword)
+        if run_id is None:
+            return []
+
+        query = f"""SELECT p.name, o.price, o.sold, p.link
+                    FROM observations o JOIN products p ON p.id = o.product_id
+                    WHERE o.run_id = ?
+                    ORDER BY {_order_by(sort_option)}"""
+        try:
+            self.cursor.execute(query, (run_id,))
             return self.cursor.fetchall()
         except sqlite3.Error as e:
             print(f"Error retrieving products: {e}")
             return []
-        
-    def get_all_product_tables(self):
-        query = "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'products_%'"
+
+    def get_data_version(self, keyword):
+        try:
+            self.cursor.execute("SELECT data_version FROM keywords WHERE keyword = ?", (keyword,))
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Error retrieving data version: {e}")
+            return 0
+
+    def get_run_size(self, run_id):
+        try:
+            self.cursor.execute("SELECT items FROM scrape_runs WHERE id = ?", (run_id,))
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Error retrieving run size: {e}")
+            return 0
+
+    def get_products_page(self, run_id, sort_option='default', after=None, limit=100, offset=0):
+        """Return up to limit ((name, price, sold, link), sort_key) pairs of one run.
+
+        Rows start right after the sort key `after` (None for the top), skipping
+        `offset` more rows first, so callers can page with bookmarks instead of
+        large OFFSETs.
+        """
+        keys = _SORT_KEYS.get(sort_option, _SORT_KEYS['default'])
+        where = "o.run_id = ?"
+        params = [run_id]
+        if after is not None:
+            keyset, keyset_params = _keyset_filter(keys, after)
+            where += " AND " + keyset
+            params.extend(keyset_params)
+
+        query = f"""SELECT p.name, o.price, o.sold, p.link, {", ".join(column for column, _ in keys)}
+                    FROM observations o JOIN products p ON p.id = o.product_id
+                    WHERE {where}
+                    ORDER BY {_order_by(sort_option)}
+                    LIMIT ? OFFSET ?"""
+        try:
+            self.cursor.execute(query, params + [limit, offset])
+            return [(row[:4], row[4:]) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error retrieving products page: {e}")
+            return []
+
+    def get_price_history(self, item_id):
+        """Return (ts, price_min, price_max, sold_count, run_id) rows for one item, oldest first"""
+        query = """SELECT ts, price_min, price_max, sold_count, run_id FROM observations
+                   WHERE product_id = ? ORDER BY ts"""
+        try:
+            self.cursor.execute(query, (item_id,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error retrieving price history: {e}")
+            return []
+
+    def get_daily_prices(self, item_id, days=None):
+        """Return (day, min_price, max_price, last_price, last_sold) rows for one item,
+        oldest first, optionally only the last `days` days it was seen"""
+        query = """SELECT day, min_price, max_price, last_price, last_sold FROM daily_prices
+                   WHERE product_id = ? AND day >= ? ORDER BY day"""
+        try:
+            if days is None:
+                since = ''
+            else:
+                self.cursor.execute("SELECT date(MAX(day), ?) FROM daily_prices WHERE product_id = ?",
+                                    (f"-{days} days", item_id))
+                since = self.cursor.fetchone()[0] or ''
+            self.cursor.execute(query, (item_id, since))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error retrieving daily prices: {e}")
+            return []
+
+    def get_price_drops(self, keyword, days=30, limit=20):
+        """Return the items of keyword's latest run whose price fell since the
+        item was last seen, biggest drop (in percent) first.
+
+        Rows are (name, link, previous_price, price, drop_percent, lowest_price),
+        prices in centavos; lowest_price is the lowest over the last `days` days.
+        """
+        run_id = self.get_latest_run(keyword)
+        if run_id is None:
+            return []
+
+        # The previous observation is one seek back along idx_observations_product,
+        # so two runs on the same day are compared with each other
+        query = """SELECT p.name, p.link, prev.price_min, o.price_min,
+                          100.0 * (prev.price_min - o.price_min) / prev.price_min AS drop_percent,
+                          (SELECT MIN(min_price) FROM daily_prices
+                           WHERE product_id = o.product_id AND day >= date(o.ts, ?))
+                   FROM observations o
+                   JOIN products p ON p.id = o.product_id
+                   JOIN observations prev ON prev.id =
+                        (SELECT id FROM observations
+                         WHERE product_id = o.product_id AND price_min > 0
+                           AND (ts < o.ts OR (ts = o.ts AND id < o.id))
+                         ORDER BY ts DESC, id DESC LIMIT 1)
+                   WHERE o.run_id = ? AND o.price_min > 0 AND o.price_min < prev.price_min
+                   ORDER BY drop_percent DESC
+                   LIMIT ?"""
+        try:
+            self.cursor.execute(query, (f"-{days} days", run_id, limit))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error retrieving price drops: {e}")
+            return []
+
+    def get_top_movers(self, keyword, days=7, limit=20):
+        """Return the items of keyword's latest run that sold the most per day
+        over the last `days` days, fastest first.
+
+        Rows are (name, link, price, sold_delta, sold_per_day), price in centavos.
+        """
+        run_id = self.get_latest_run(keyword)
+        if run_id is None:
+            return []
+
+        query = """SELECT p.name, p.link, cur.last_price, cur.last_sold - first.first_sold AS sold_delta,
+                          1.0 * (cur.last_sold - first.first_sold)
+                              / max(julianday(cur.last_ts) - julianday(first.first_ts), 1) AS sold_per_day
+                   FROM observations o
+                   JOIN products p ON p.id = o.product_id
+                   JOIN daily_prices cur ON cur.product_id = o.product_id AND cur.day = date(o.ts)
+                   JOIN daily_prices first ON first.product_id = o.product_id
+                        AND first.day = (SELECT MIN(day) FROM daily_prices
+                                         WHERE product_id = o.product_id AND day >= date(cur.day, ?))
+                   WHERE o.run_id = ? AND sold_delta > 0
+                   ORDER BY sold_per_day DESC
+                   LIMIT ?"""
         try:
-            self.cursor.execute(query)
-            tables = self.cursor.fetchall()
-            # Extract keywords from table names (remove 'products_' prefix)
-            return [table[0].replace('products_', '').replace('_', ' ') for table in tables]
+            self.cursor.execute(query, (f"-{days} days", run_id, limit))
+            return self.cursor.fetchall()
         except sqlite3.Error as e:
-            print(f"Error getting tables: {e}")
+            print(f"Error retrieving top movers: {e}")
+            return []
+
+    def search_products(self, text, min_price=None, max_price=None, min_sold=None, limit=200):
+        """Return (name, price, sold, link, keyword) rows whose name matches every
+        word of text as a prefix, best match first, across all keywords.
+
+        Price and sold figures are the latest seen for each product, and
+        keyword is the search it was last updated by. min_price and
+        max_price are in pesos and compared with the item's lowest price.
+        """
+        query = _fts_query(text)
+        if not query:
+            return []
+
+        filters = []
+        params = [query]
+        if min_price is not None:
+            filters.append("p.price_min >= ?")
+            params.append(int(round(min_price * 100)))
+        if max_price is not None:
+            filters.append("p.price_min <= ?")
+            params.append(int(round(max_price * 100)))
+        if min_sold is not None:
+            filters.append("p.sold_count >= ?")
+            params.append(min_sold)
+
+        sql = f"""SELECT p.name, p.price, p.sold, p.link, k.keyword
+                  FROM (SELECT rowid AS product_id, bm25(product_search) AS score
+                        FROM product_search WHERE product_search MATCH ?) m
+                  JOIN products p ON p.id = m.product_id
+                  JOIN scrape_runs r ON r.id = p.updated_run_id
+                  JOIN keywords k ON k.id = r.keyword_id
+                  {"WHERE " + " AND ".join(filters) if filters else ""}
+                  ORDER BY m.score
+                  LIMIT ?"""
+        try:
+            self.cursor.execute(sql, params + [limit])
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching products: {e}")
+            return []
+
+    def iter_observations(self, keyword=None, since=None, until=None, min_price=None, max_price=None,
+                          batch_size=EXPORT_BATCH_SIZE):
+        """Yield lists of at most batch_size observation rows, oldest first.
+
+        Rows are (keyword, run_id, ts, item_id, shop_id, name, price, sold,
+        price_min, price_max, sold_count, link). since and until are dates
+        ('2024-05-31', both inclusive); min_price and max_price are pesos
+        compared with price_min. Rows are read with fetchmany on a cursor of
+        their own, so memory use does not grow with the table.
+        """
+        filters = []
+        params = []
+        if keyword is not None:
+            filters.append("k.keyword = ?")
+            params.append(keyword)
+        if since is not None:
+            filters.append("o.ts >= ?")
+            params.append(since)
+        if until is not None:
+            filters.append("o.ts < date(?, '+1 day')")
+            params.append(until)
+        if min_price is not None:
+            filters.append("o.price_min >= ?")
+            params.append(int(round(min_price * 100)))
+        if max_price is not None:
+            filters.append("o.price_min <= ?")
+            params.append(int(round(max_price * 100)))
+
+        query = f"""SELECT k.keyword, o.run_id, o.ts, o.product_id, p.shop_id, p.name, o.price, o.sold,
+                           o.price_min, o.price_max, o.sold_count, p.link
+                    FROM observations o
+                    JOIN products p ON p.id = o.product_id
+                    JOIN scrape_runs r ON r.id = o.run_id
+                    JOIN keywords k ON k.id = r.keyword_id
+                    {"WHERE " + " AND ".join(filters) if filters else ""}
+                    ORDER BY o.id"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def enqueue_job(self, keyword, pages=3, priority=0, max_attempts=JOB_MAX_ATTEMPTS):
+        """Queue a search for the workers and return the job id; higher priority goes first"""
+        try:
+            with self.transaction():
+                self.cursor.execute("INSERT INTO jobs (keyword, pages, priority, max_attempts) VALUES (?, ?, ?, ?)",
+                                    (keyword, pages, priority, max_attempts))
+                return self.cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Error queueing job: {e}")
+            return None
+
+    def _requeue_expired(self, now):
+        # Jobs of workers that died (or hung) without finishing
+        self.cursor.execute(
+            """UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                               error = 'lease expired', lease_owner = NULL, lease_expires = NULL,
+                               finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END
+               WHERE status = 'running' AND lease_expires < ?""",
+            (now,)
+        )
+        return self.cursor.rowcount
+
+    def lease_job(self, owner, lease_seconds=JOB_LEASE_SECONDS):
+        """Claim the next queued job for owner and return (id, keyword, pages, attempt), or None.
+
+        The claim runs in one write transaction, so two workers never get
+        the same job. Expired leases are requeued first.
+        """
+        now = time.time()
+        try:
+            with self.transaction():
+                requeued = self._requeue_expired(now)
+                if requeued:
+                    print(f"Requeued {requeued} jobs whose lease expired")
+                self.cursor.execute("SELECT id, keyword, pages, attempts FROM jobs WHERE status = 'queued' "
+                                    "ORDER BY priority DESC, id LIMIT 1")
+                row = self.cursor.fetchone()
+                if row is None:
+                    return None
+                job_id, keyword, pages, attempts = row
+                self.cursor.execute(
+                    """UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?,
+                                       attempts = attempts + 1, pages_done = 0, items = 0, error = NULL
+                       WHERE id = ?""",
+                    (owner, now + lease_seconds, job_id)
+                )
+                return job_id, keyword, pages, attempts + 1
+        except sqlite3.Error as e:
+            print(f"Error leasing job: {e}")
+            return None
+
+    def renew_lease(self, job_id, owner, lease_seconds=JOB_LEASE_SECONDS, pages_done=None, items=None):
+        """Extend owner's lease on job_id, optionally recording progress.
+
+        Returns False if owner no longer holds the job (its lease expired and
+        another worker took it over), in which case the work should stop.
+        """
+        try:
+            with self.transaction():
+                self.cursor.execute(
+                    """UPDATE jobs SET lease_expires = ?, pages_done = COALESCE(?, pages_done),
+                                       items = COALESCE(?, items)
+                       WHERE id = ? AND lease_owner = ? AND status = 'running'""",
+                    (time.time() + lease_seconds, pages_done, items, job_id, owner)
+                )
+                return self.cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"Error renewing lease on job {job_id}: {e}")
+            return False
+
+    def finish_job(self, job_id, owner, items=0, error=None):
+        """Mark owner's job done, or on error requeue it while it has attempts left"""
+        try:
+            with self.transaction():
+                if error is None:
+                    self.cursor.execute(
+                        """UPDATE jobs SET status = 'done', items = ?, lease_owner = NULL, lease_expires = NULL,
+                                           finished_at = CURRENT_TIMESTAMP
+                           WHERE id = ? AND lease_owner = ?""",
+                        (items, job_id, owner)
+                    )
+                else:
+                    self.cursor.execute(
+                        """UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                                           error = ?, lease_owner = NULL, lease_expires = NULL,
+                                           finished_at = CASE WHEN attempts < max_attempts THEN NULL
+                                                              ELSE CURRENT_TIMESTAMP END
+                           WHERE id = ? AND lease_owner = ?""",
+                        (error, job_id, owner)
+                    )
+        except sqlite3.Error as e:
+            print(f"Error finishing job {job_id}: {e}")
+
+    def release_job(self, job_id, owner):
+        """Hand a job back untouched, e.g. when its worker is shut down; the attempt does not count"""
+        try:
+            with self.transaction():
+                self.cursor.execute(
+                    """UPDATE jobs SET status = 'queued', attempts = attempts - 1,
+                                       lease_owner = NULL, lease_expires = NULL
+                       WHERE id = ? AND lease_owner = ? AND status = 'running'""",
+                    (job_id, owner)
+                )
+        except sqlite3.Error as e:
+            print(f"Error releasing job {job_id}: {e}")
+
+    def get_jobs(self, limit=50):
+        """Return (id, keyword, status, pages_done, pages, items, attempts, lease_owner, error)
+        rows: unfinished jobs first, then the most recent"""
+        query = """SELECT id, keyword, status, pages_done, pages, items, attempts, lease_owner, error
+                   FROM jobs ORDER BY status IN ('done', 'failed'), id DESC LIMIT ?"""
+        try:
+            self.cursor.execute(query, (limit,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error retrieving jobs: {e}")
+            return []
+
+    def get_keywords(self):
+        try:
+            self.cursor.execute("SELECT keyword FROM keywords ORDER BY keyword")
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error getting keywords: {e}")
             return []
         
+    def close_thread(self):
+        """Close the calling thread's connection, e.g. before the thread exits"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            with self._lock:
+                self._connections.discard(conn)
+            conn.close()
+            self._local.conn = None
+            self._local.cursor = None
+
     def close(self):
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+        """Close every thread's connection"""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
\ No newline at end of file
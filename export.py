@@ -0,0 +1,159 @@
+"""Export stored observations to CSV, JSON lines or Parquet.
+
+Usage: python -m export out.csv [--keyword phone] [--since 2024-05-01] [--until 2024-05-31]
+                                [--min-price 100] [--max-price 500] [--db shopee_products.db]
+
+The format follows the file extension (.csv, .jsonl, .parquet) unless
+--format is given. Rows are read and written a batch at a time, so
+memory use stays flat however large the database is. Parquet needs
+pyarrow (pip install pyarrow).
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from config import *
+from database import shared_database
+
+# Parquet is optional; only offered when pyarrow is installed
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+COLUMNS = ('keyword', 'run_id', 'ts', 'item_id', 'shop_id', 'name', 'price', 'sold',
+           'price_min', 'price_max', 'sold_count', 'link')
+
+
+def _write_csv(path, batches):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for rows in batches:
+            writer.writerows(rows)
+
+
+def _write_jsonl(path, batches):
+    with open(path, 'w', encoding='utf-8') as f:
+        for rows in batches:
+            f.writelines(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _parquet_schema():
+    return pa.schema([
+        ('keyword', pa.string()), ('run_id', pa.int64()), ('ts', pa.string()),
+        ('item_id', pa.int64()), ('shop_id', pa.int64()), ('name', pa.string()),
+        ('price', pa.string()), ('sold', pa.string()), ('price_min', pa.int64()),
+        ('price_max', pa.int64()), ('sold_count', pa.int64()), ('link', pa.string()),
+    ])
+
+
+def _write_parquet(path, batches, row_group_size=EXPORT_ROW_GROUP_SIZE):
+    schema = _parquet_schema()
+    pending = []
+
+    def flush(writer):
+        columns = list(zip(*pending)) if pending else [[] for _ in COLUMNS]
+        writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type)
+                                                 for column, field in zip(columns, schema)], schema=schema))
+        pending.clear()
+
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for rows in batches:
+            pending.extend(rows)
+            if len(pending) >= row_group_size:
+                flush(writer)
+        if pending:
+            flush(writer)
+
+
+_WRITERS = {
+    'csv': _write_csv,
+    'jsonl': _write_jsonl,
+    'parquet': _write_parquet if pa else None,
+}
+
+_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.ndjson': 'jsonl',
+               '.parquet': 'parquet', '.pq': 'parquet'}
+
+
+def available_formats():
+    return [name for name, writer in _WRITERS.items() if writer]
+
+
+def format_for(path):
+    """Guess the export format from the file extension, defaulting to CSV"""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def export(db, path, format=None, batch_size=EXPORT_BATCH_SIZE, on_progress=None, **filters):
+    """Write the observations matching filters (see DatabaseManager.iter_observations)
+    to path and return the number of rows written.
+
+    The file is written next to path and moved into place when complete,
+    so a failed export never leaves a truncated file behind. on_progress,
+    if given, is called with the running row count after every batch.
+    """
+    format = format or format_for(path)
+    writer = _WRITERS.get(format)
+    if writer is None:
+        raise ValueError(f"Export format '{format}' is not available; choose one of {available_formats()}")
+
+    count = 0
+
+    def batches():
+        nonlocal count
+        for rows in db.iter_observations(batch_size=batch_size, **filters):
+            count += len(rows)
+            yield rows
+            if on_progress:
+                on_progress(count)
+
+    tmp_path = f"{path}.tmp"
+    try:
+        writer(tmp_path, batches())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m export", description="Export stored observations")
+    parser.add_argument('path', help="output file; .csv, .jsonl or .parquet")
+    parser.add_argument('--format', choices=list(_WRITERS), help="override the format implied by the extension")
+    parser.add_argument('--keyword', help="only this saved search")
+    parser.add_argument('--since', help="first day to include, YYYY-MM-DD")
+    parser.add_argument('--until', help="last day to include, YYYY-MM-DD")
+    parser.add_argument('--min-price', type=float, help="lowest price in pesos")
+    parser.add_argument('--max-price', type=float, help="highest price in pesos")
+    parser.add_argument('--db', default=DB_NAME, help=f"SQLite database (default: {DB_NAME})")
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE,
+                        help=f"rows read per batch (default: {EXPORT_BATCH_SIZE})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db = shared_database(args.db)
+    start = time.perf_counter()
+    try:
+        count = export(db, args.path, args.format, args.batch_size, keyword=args.keyword, since=args.since,
+                       until=args.until, min_price=args.min_price, max_price=args.max_price)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"Error exporting: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print(f"Exported {count} rows to {args.path} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Timing spans, counters and histograms for scrape runs.
+
+Use the module-level `metrics` registry:
+
+    with metrics.span('page.scroll'):
+        ...
+    metrics.incr('products_total', len(products))
+
+Every span is observed in the `<name>_seconds` histogram and kept as an
+event until flush_jsonl() appends it to a JSON-lines file; prometheus_text()
+renders all counters and histograms in the Prometheus text format.
+"""
+import cProfile
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from SQLite commits up to page loads and CAPTCHAs
+_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+
+
+class Histogram:
+    def __init__(self, buckets=_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """Thread-safe registry; metric names follow Prometheus conventions"""
+
+    def __init__(self, prefix="shopee_", max_events=10000):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._events = deque(maxlen=max_events)
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, name, info=None, **labels):
+        """Time a block into the <name>_seconds histogram and record it as an event.
+
+        labels become Prometheus labels, so keep them low-cardinality; info
+        (e.g. the keyword or page number) only goes into the JSON event.
+        """
+        start = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.observe(f"{name.replace('.', '_')}_seconds", duration, **labels)
+            event = {'type': 'span', 'name': name, 'start': round(start, 3), 'seconds': round(duration, 4),
+                     'thread': threading.current_thread().name}
+            if labels:
+                event['labels'] = labels
+            if info:
+                event.update(info)
+            if error:
+                event['error'] = error
+            with self._lock:
+                self._events.append(event)
+
+    def counter_total(self, name):
+        """Value of counter name summed over all its labels"""
+        with self._lock:
+            return sum(value for (counter, _), value in self._counters.items() if counter == name)
+
+    def histogram_sum(self, name):
+        """Total observed in histogram name over all its labels, e.g. seconds spent in a span"""
+        with self._lock:
+            return sum(h.sum for (histogram_name, _), h in self._histograms.items() if histogram_name == name)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._events.clear()
+
+    def flush_jsonl(self, path):
+        """Append recorded span events plus a snapshot of the counters to path"""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self._counters.items()]
+        with open(path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+            f.write(json.dumps({'type': 'counters', 'ts': round(time.time(), 3), 'counters': counters}) + "\n")
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {self.prefix}{name} counter")
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f"{self.prefix}{name}{_label_text(labels)} {value}")
+
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {self.prefix}{name} histogram")
+                for (histogram_name, labels), histogram in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else repr(bound)
+                        lines.append(f"{self.prefix}{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{self.prefix}{name}_sum{_label_text(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{self.prefix}{name}_count{_label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write prometheus_text() to path atomically, e.g. for node_exporter's textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def export(self, jsonl_path=None, prometheus_path=None):
+        try:
+            if jsonl_path:
+                self.flush_jsonl(jsonl_path)
+            if prometheus_path:
+                self.write_prometheus(prometheus_path)
+        except OSError as e:
+            print(f"Error exporting metrics: {e}")
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(path=None):
+    """Profile the block with cProfile into path (a pstats file); no-op without a path.
+
+    cProfile only sees the thread it runs on, so wrap code on the thread
+    doing the work. py-spy needs no hook; attach it to the running process
+    (py-spy record -o profile.svg --pid <pid>).
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
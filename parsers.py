@@ -0,0 +1,227 @@
+import soupsieve
+from bs4 import BeautifulSoup
+from config import *
+from database import parse_item_ids
+
+# Faster parsers are optional; parse_search_html only offers what is installed
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+SEARCH_API_PATH = "/api/v4/search/search_items"
+
+CARD_SELECTOR = 'li.shopee-search-item-result__item'
+NAME_SELECTOR = 'div.line-clamp-2.break-words.min-w-0.min-h-\\[2\\.5rem\\].text-sm'
+PRICE_SELECTOR = 'span.font-medium.text-base\\/5.truncate'
+SOLD_SELECTOR = 'div.truncate.text-shopee-black87.text-xs.min-h-4'
+LINK_SELECTOR = 'a.contents'
+CAPTCHA_SELECTOR = "iframe[src*='captcha' i], [class*='captcha' i], [id*='captcha' i]"
+
+# Shopee's API reports prices multiplied by 100000
+_API_PRICE_SCALE = 100000
+
+# Runs inside the page and returns only the four fields we need per card,
+# so the document never has to be serialized and shipped to Python.
+CARD_EXTRACT_JS = """
+([card, name, price, sold, link]) => Array.from(document.querySelectorAll(card), el => {
+    const text = selector => {
+        const node = el.querySelector(selector);
+        return node ? node.textContent.trim() : null;
+    };
+    const anchor = el.querySelector(link);
+    return {
+        name: text(name),
+        price: text(price),
+        sold: text(sold),
+        href: anchor ? anchor.getAttribute('href') : null
+    };
+})
+"""
+CARD_EXTRACT_ARGS = [CARD_SELECTOR, NAME_SELECTOR, PRICE_SELECTOR, SOLD_SELECTOR, LINK_SELECTOR]
+
+# Returns [rendered cards, cards whose lazily loaded price is present]
+CARD_COUNT_JS = """
+([card, price]) => {
+    const cards = document.querySelectorAll(card);
+    let hydrated = 0;
+    cards.forEach(el => { if (el.querySelector(price)) hydrated++; });
+    return [cards.length, hydrated];
+}
+"""
+CARD_COUNT_ARGS = [CARD_SELECTOR, PRICE_SELECTOR]
+
+
+def format_price(price_min, price_max):
+    """Render centavo amounts the way Shopee shows them, e.g. '₱100 - ₱250'"""
+    def peso(centavos):
+        if centavos % 100:
+            return f"₱{centavos / 100:,.2f}"
+        return f"₱{centavos // 100:,}"
+
+    if price_max is None or price_max == price_min:
+        return peso(price_min)
+    return f"{peso(price_min)} - {peso(price_max)}"
+
+
+def product_link(shop_id, item_id, base_url=BASE_URL):
+    """Canonical product URL, the same whichever way the item was scraped"""
+    return f"{base_url}/product/{shop_id}/{item_id}"
+
+
+def is_search_api_response(url):
+    return SEARCH_API_PATH in url
+
+
+def is_captcha_url(url):
+    """True if Shopee sent the browser to a CAPTCHA or verification page"""
+    url = (url or '').lower()
+    return "captcha" in url or "/verify/" in url
+
+
+def parse_search_items(payload, base_url=BASE_URL):
+    """Build product records from a search_items API response"""
+    products = []
+    seen = set()
+    for item in (payload or {}).get('items') or []:
+        basic = item.get('item_basic') or item
+        try:
+            item_id = int(basic['itemid'])
+            shop_id = int(basic['shopid'])
+            price_min = basic.get('price_min') or basic['price']
+            price_max = basic.get('price_max') or basic['price']
+            price_min = price_min * 100 // _API_PRICE_SCALE
+            price_max = price_max * 100 // _API_PRICE_SCALE
+            sold_count = int(basic.get('historical_sold') or 0)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error parsing API item: {e}")
+            continue
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+
+        products.append({
+            'name': basic.get('name', ''),
+            'price': format_price(price_min, price_max),
+            'sold': f"{sold_count:,} sold",
+            'link': product_link(shop_id, item_id, base_url),
+            'item_id': item_id,
+            'shop_id': shop_id,
+            'price_min': price_min,
+            'price_max': price_max,
+            'sold_count': sold_count,
+        })
+    return products
+
+
+def parse_card_records(records, base_url=BASE_URL):
+    """Build product records from the output of CARD_EXTRACT_JS.
+
+    The shop and item ids are read from each card's link, which is then
+    rewritten to the canonical product URL; a card repeating an item
+    already on the page is dropped.
+    """
+    products = []
+    seen = set()
+    skipped = 0
+    for record in records or []:
+        if not all(record.get(field) for field in ('name', 'price', 'sold', 'href')):
+            skipped += 1
+            continue
+        product = {
+            'name': record['name'],
+            'price': record['price'],
+            'sold': record['sold'],
+            'link': base_url + record['href'].split('?')[0]
+        }
+        shop_id, item_id = parse_item_ids(record['href'])
+        if item_id is not None:
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            product.update(link=product_link(shop_id, item_id, base_url), item_id=item_id, shop_id=shop_id)
+        products.append(product)
+    if skipped:
+        print(f"Skipped {skipped} incomplete product cards")
+    return products
+
+
+class _Bs4Backend:
+    def __init__(self):
+        self.card = soupsieve.compile(CARD_SELECTOR)
+        self.fields = [soupsieve.compile(selector)
+                       for selector in (NAME_SELECTOR, PRICE_SELECTOR, SOLD_SELECTOR, LINK_SELECTOR)]
+
+    def records(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        for card in self.card.select(soup):
+            name, price, sold, anchor = (field.select_one(card) for field in self.fields)
+            yield {
+                'name': name.get_text(strip=True) if name else None,
+                'price': price.get_text(strip=True) if price else None,
+                'sold': sold.get_text(strip=True) if sold else None,
+                'href': anchor.get('href') if anchor else None,
+            }
+
+
+class _LxmlBackend:
+    def __init__(self):
+        self.card = CSSSelector(CARD_SELECTOR)
+        self.fields = [CSSSelector(selector)
+                       for selector in (NAME_SELECTOR, PRICE_SELECTOR, SOLD_SELECTOR, LINK_SELECTOR)]
+
+    def records(self, html):
+        for card in self.card(lxml.html.fromstring(html)):
+            name, price, sold, anchor = (next(iter(field(card)), None) for field in self.fields)
+            yield {
+                'name': name.text_content().strip() if name is not None else None,
+                'price': price.text_content().strip() if price is not None else None,
+                'sold': sold.text_content().strip() if sold is not None else None,
+                'href': anchor.get('href') if anchor is not None else None,
+            }
+
+
+class _SelectolaxBackend:
+    # selectolax has no compiled selector objects; the strings are reused as-is
+    def records(self, html):
+        for card in LexborHTMLParser(html).css(CARD_SELECTOR):
+            name = card.css_first(NAME_SELECTOR)
+            price = card.css_first(PRICE_SELECTOR)
+            sold = card.css_first(SOLD_SELECTOR)
+            anchor = card.css_first(LINK_SELECTOR)
+            yield {
+                'name': name.text(strip=True) if name else None,
+                'price': price.text(strip=True) if price else None,
+                'sold': sold.text(strip=True) if sold else None,
+                'href': anchor.attributes.get('href') if anchor else None,
+            }
+
+
+_BACKEND_CLASSES = {
+    'bs4': _Bs4Backend,
+    'lxml': _LxmlBackend if lxml else None,
+    'selectolax': _SelectolaxBackend if LexborHTMLParser else None,
+}
+_backends = {}
+
+
+def available_backends():
+    return [name for name, backend_class in _BACKEND_CLASSES.items() if backend_class]
+
+
+def parse_search_html(html, backend='bs4', base_url=BASE_URL):
+    """Parse a rendered search results page with the named HTML backend"""
+    if backend not in _backends:
+        backend_class = _BACKEND_CLASSES.get(backend)
+        if backend_class is None:
+            raise ValueError(f"HTML parser backend '{backend}' is not available; "
+                             f"choose one of {available_backends()}")
+        # Built once so the compiled selectors are shared by every page
+        _backends[backend] = backend_class()
+    return parse_card_records(_backends[backend].records(html), base_url)
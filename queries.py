@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+from database import shared_database
+
+
+class QueryExecutor:
+    """Runs database reads for the GUI on a background thread.
+
+    Tasks are called as task(db) in the order they were submitted; db is
+    the shared manager, so they read through the worker thread's own
+    connection. Tk is not thread-safe, so results are handed back to
+    callback(result) through root.after on the main loop.
+    """
+
+    def __init__(self, root, db_name=DB_NAME):
+        self.root = root
+        self.db = shared_database(db_name)
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, task, callback):
+        """Run task(db) in the background, then callback(result) on the Tk thread.
+
+        callback gets None if the task raised.
+        """
+        future = self._pool.submit(task, self.db)
+        future.add_done_callback(lambda done: self.root.after(0, self._deliver, done, callback))
+
+    def _deliver(self, future, callback):
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error running query: {e}")
+            result = None
+        callback(result)
+
+    def close(self):
+        self._pool.submit(self.db.close_thread)
+        self._pool.shutdown(wait=False)
+
+
+class ResultCache:
+    """LRU of query results keyed by (keyword, ...) tuples; main thread only"""
+
+    def __init__(self, size=16):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, keyword):
+        """Drop every result for keyword, e.g. after a scrape stored new rows"""
+        for key in [key for key in self._entries if key[0] == keyword]:
+            del self._entries[key]
@@ -3,28 +3,89 @@ import random
 import time
 import json
 import threading
-import tkinter as tk
 from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from blocking import ResourceBlocker
+from browser import LOCALE, USER_AGENT, launch_browser, search_url
 from config import *
-from database import DatabaseManager
+from database import shared_database
+from metrics import metrics, profiled
+from parsers import (CAPTCHA_SELECTOR, CARD_COUNT_ARGS, CARD_COUNT_JS, CARD_EXTRACT_ARGS, CARD_EXTRACT_JS,
+                     is_captcha_url, is_search_api_response, parse_card_records, parse_search_html,
+                     parse_search_items)
+from session import SessionManager, is_login_page
+
+
+def wait_for_captcha(page, timeout=120):
+    """Default CAPTCHA handler without a GUI: wait for someone to solve it in the
+    browser window, or raise once timeout seconds have passed"""
+    print(f"CAPTCHA detected on {page.url}, waiting up to {timeout}s for it to be solved...")
+    deadline = time.monotonic() + timeout
+    while is_captcha_url(page.url) or page.query_selector(CAPTCHA_SELECTOR):
+        if time.monotonic() > deadline:
+            raise RuntimeError("CAPTCHA was not solved in time")
+        page.wait_for_timeout(2000)
+
 
 class ShopeeScraper:
-    def __init__(self, root):
+    """Logs in to Shopee and scrapes search results into the database.
+
+    root is the Tk root when running under the GUI, or None. When a CAPTCHA
+    shows up, captcha_handler(page) is called and must return once it is
+    solved (or raise to give up); by default that is a Tk popup under the
+    GUI and wait_for_captcha() otherwise.
+
+    Results go to shared_database(db_name) unless db is given, e.g. a
+    coordinator.RemoteDatabase on a worker host without the database.
+    """
+
+    def __init__(self, root=None, service=None, headless=HEADLESS, captcha_handler=None, db_name=DB_NAME,
+                 base_url=BASE_URL, human_delays=HUMAN_DELAYS, channel=BROWSER_CHANNEL, session=None, db=None):
         self.root = root
+        self.service = service
+        if session is None:
+            session = service.session if service is not None else SessionManager()
+        self.session = session
+        self.headless = headless
+        self.channel = channel
+        self.db_name = db_name
+        self.db = db
+        self.base_url = base_url
+        self.human_delays = human_delays
+        if captcha_handler is None:
+            captcha_handler = self._captcha_popup if root is not None else wait_for_captcha
+        self.captcha_handler = captcha_handler
+        if service is not None:
+            self.blocker = service.blocker
+        else:
+            self.blocker = ResourceBlocker() if BLOCK_RESOURCES else None
         self.wait_time = 25
-        self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        self.user_agent = USER_AGENT
         self.playwright = None
         self.browser = None
         self.page = None
-        self.locale = "en-US,en;q=0.9"
+        self.locale = LOCALE
         self.cookie_file = COOKIE_FILE
+        self.extraction_mode = EXTRACTION_MODE
+        self.navigation_mode = NAVIGATION_MODE
+        self._api_responses = []
+        self.page_stats = []
+        # Status of the last scrape run: 'completed', 'failed', or None if
+        # no run was started
+        self.run_status = None
 
     def _human_like_delay(self, min_sec=1, max_sec=4):
-        time.sleep(random.uniform(min_sec, max_sec))
+        if not self.human_delays:
+            return
+        delay = random.uniform(min_sec, max_sec)
+        metrics.incr('sleep_seconds_total', delay, kind='human')
+        time.sleep(delay)
 
     def _typing_delay(self):
-        time.sleep(random.uniform(0.05, 0.3))
+        if not self.human_delays:
+            return
+        delay = random.uniform(0.05, 0.3)
+        metrics.incr('sleep_seconds_total', delay, kind='typing')
+        time.sleep(delay)
 
     def _move_mouse_naturally(self, element):
         box = element.bounding_box()
@@ -40,46 +101,59 @@ class ShopeeScraper:
         self.page.mouse.move(x, y, steps=random.randint(2, 5))
         self._human_like_delay(0.1, 0.3)
 
+    def _captcha_present(self):
+        # A URL check plus one selector query instead of serializing the page
+        if is_captcha_url(self.page.url):
+            return True
+        return self.page.query_selector(CAPTCHA_SELECTOR) is not None
+
     def _handle_captcha_manually(self):
-        """Handle CAPTCHA with GUI popup instead of console input"""
-        if "captcha" in self.page.content().lower():
-            # Create a simple Tkinter popup
-            captcha_window = tk.Toplevel()
-            captcha_window.title("CAPTCHA Required")
-            
-            # Center the window
-            window_width = 300
-            window_height = 120
-            screen_width = captcha_window.winfo_screenwidth()
-            screen_height = captcha_window.winfo_screenheight()
-            x = int((screen_width/2) - (window_width/2))
-            y = int((screen_height/2) - (window_height/2))
-            captcha_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
-            
-            # Add message and button
-            message = ("CAPTCHA detected!\n\n"
-                    "Please solve it manually in the browser window,\n"
-                    "then click OK to continue.")
-            tk.Label(captcha_window, text=message, padx=20, pady=10).pack()
-            
-            # This variable will track if the user clicked OK
-            captcha_solved = threading.Event()
-            
-            def on_ok_click():
-                captcha_solved.set()
-                captcha_window.destroy()
-            
-            ok_button = tk.Button(captcha_window, text="OK", command=on_ok_click)
-            ok_button.pack(pady=10)
-            
-            # Make the window modal
-            captcha_window.grab_set()
-            
-            # Wait for the user to click OK
-            self.root.wait_window(captcha_window)
+        if self._captcha_present():
+            metrics.incr('captchas_total')
+            with metrics.span('captcha'):
+                self.captcha_handler(self.page)
             return True
         return False
 
+    def _captcha_popup(self, page):
+        """Handle CAPTCHA with GUI popup instead of console input"""
+        # Imported here so the scraper also runs where Tk is not installed
+        import tkinter as tk
+        # Create a simple Tkinter popup
+        captcha_window = tk.Toplevel()
+        captcha_window.title("CAPTCHA Required")
+        
+        # Center the window
+        window_width = 300
+        window_height = 120
+        screen_width = captcha_window.winfo_screenwidth()
+        screen_height = captcha_window.winfo_screenheight()
+        x = int((screen_width/2) - (window_width/2))
+        y = int((screen_height/2) - (window_height/2))
+        captcha_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
+        
+        # Add message and button
+        message = ("CAPTCHA detected!\n\n"
+                "Please solve it manually in the browser window,\n"
+                "then click OK to continue.")
+        tk.Label(captcha_window, text=message, padx=20, pady=10).pack()
+        
+        # This variable will track if the user clicked OK
+        captcha_solved = threading.Event()
+        
+        def on_ok_click():
+            captcha_solved.set()
+            captcha_window.destroy()
+        
+        ok_button = tk.Button(captcha_window, text="OK", command=on_ok_click)
+        ok_button.pack(pady=10)
+        
+        # Make the window modal
+        captcha_window.grab_set()
+        
+        # Wait for the user to click OK
+        self.root.wait_window(captcha_window)
+
     def _save_cookies(self):
         cookies = self.page.context.cookies()
         with open(self.cookie_file, 'w') as f:
@@ -105,6 +179,9 @@ class ShopeeScraper:
             return False
     def delete_cookies(self):
         try:
+            self.session.clear()
+            if self.service is not None:
+                self.service.reset_session()
             if os.path.exists(self.cookie_file):
                 os.remove(self.cookie_file)
                 print("Cookies deleted successfully")
@@ -115,12 +192,18 @@ class ShopeeScraper:
             print(f"Error deleting cookies: {e}")
             return False
         
-    def login(self, username=None, password=None):
+    def login(self, username=None, password=None, try_cookies=True):
+        with metrics.span('login'):
+            logged_in = self._login(username, password, try_cookies)
+        metrics.incr('logins_total', result='ok' if logged_in else 'failed')
+        return logged_in
+
+    def _login(self, username, password, try_cookies=True):
         try:
             # Try to load cookies first
-            if self._load_cookies():
+            if try_cookies and self._load_cookies():
                 print("Attempting to use saved cookies...")
-                self.page.goto("https://shopee.ph", timeout=60000)
+                self.page.goto(self.base_url, timeout=60000)
                 self._human_like_delay(2, 4)
                 
                 if self._is_logged_in():
@@ -130,7 +213,7 @@ class ShopeeScraper:
             # If cookie login fails and credentials provided, do manual login
             if username and password:
                 print("Loading login page...")
-                self.page.goto("https://shopee.ph/buyer/login", timeout=60000)
+                self.page.goto(f"{self.base_url}/buyer/login", timeout=60000)
                 self._human_like_delay(2, 4)
 
                 print("Entering username...")
@@ -190,172 +273,384 @@ class ShopeeScraper:
             print("Login failed:", str(e))
             return False
 
-    def search_and_scrape(self, keyword, max_pages):
+    def _response_collector(self, responses):
+        # Only keep the reference; the body is read on the scraping side
+        def on_response(response):
+            if is_search_api_response(response.url):
+                responses.append(response)
+        return on_response
+
+    def _scrape_page_from_api(self, page, responses, timeout=15):
+        with metrics.span('page.api_wait'):
+            deadline = time.time() + timeout
+            while not responses and time.time() < deadline:
+                page.wait_for_timeout(100)
+
+        if not responses:
+            print("No search API response captured, falling back to page parsing")
+            metrics.incr('api_fallbacks_total')
+            return None
+
+        response = responses[-1]
+        responses.clear()
         try:
+            with metrics.span('page.parse', source='api'):
+                products = parse_search_items(response.json(), self.base_url)
+        except Exception as e:
+            print(f"Error reading search API response: {e}")
+            return None
+        print(f"Captured {len(products)} products from the search API")
+        return products
+
+    def _scroll_until_loaded(self, page, current_page):
+        with metrics.span('page.scroll', info={'page': current_page}):
+            self._scroll(page, current_page)
+
+    def _scroll(self, page, current_page):
+        start = time.time()
+        scrolls = 0
+        unchanged = 0
+        last_counts = None
+        while True:
+            cards, hydrated = page.evaluate(CARD_COUNT_JS, CARD_COUNT_ARGS)
+            if cards and hydrated >= cards:
+                break
+            unchanged = unchanged + 1 if (cards, hydrated) == last_counts else 0
+            if unchanged >= SCROLL_STABLE_CHECKS or scrolls >= MAX_SCROLLS:
+                break
+            last_counts = (cards, hydrated)
+
+            page.mouse.wheel(0, random.randint(500, 1000))
+            scrolls += 1
+            self._human_like_delay(*SCROLL_DELAY)
+
+        stats = {'page': current_page, 'scrolls': scrolls, 'seconds': round(time.time() - start, 2),
+                 'cards': cards, 'hydrated': hydrated}
+        self.page_stats.append(stats)
+        metrics.incr('scrolls_total', scrolls)
+        print(f"Loaded {hydrated}/{cards} cards with {scrolls} scrolls in {stats['seconds']}s")
+
+    def _scrape_page_from_dom(self, page, current_page):
+        print(f"Loading more products... on page {current_page}")
+        self._scroll_until_loaded(page, current_page)
+
+        print(f"Scraping product information on page {current_page}...")
+        if self.extraction_mode == 'dom':
+            with metrics.span('page.content'):
+                html = page.content()
+            with metrics.span('page.parse', source=HTML_PARSER):
+                return parse_search_html(html, HTML_PARSER, self.base_url)
+        with metrics.span('page.extract_js'):
+            return parse_card_records(page.evaluate(CARD_EXTRACT_JS, CARD_EXTRACT_ARGS), self.base_url)
+
+    def _scrape_page(self, page, responses, current_page):
+        page_products = None
+        if self.extraction_mode == 'api':
+            page_products = self._scrape_page_from_api(page, responses)
+        if page_products is None:
+            page_products = self._scrape_page_from_dom(page, current_page)
+        return page_products
+
+    def _open_tab(self):
+        if self.service is not None:
+            return self.service.acquire_page()
+        tab = self.page.context.new_page()
+        if self.blocker is not None:
+            self.blocker.attach(tab)
+        return tab
+
+    def _close_tab(self, tab):
+        if self.service is not None:
+            self.service.release_page(tab)
+        else:
+            tab.close()
+
+    def _iter_pages_by_url(self, keyword, max_pages, start_page=1):
+        for batch_start in range(start_page, max_pages + 1, MAX_TABS):
+            batch = range(batch_start, min(batch_start + MAX_TABS, max_pages + 1))
+            tabs = [self.page] + [self._open_tab() for _ in batch[1:]]
+            tab_responses = []
+            listeners = []
+            try:
+                # Start every navigation before waiting on any of them so the
+                # pages load side by side; "commit" returns once the response starts
+                print(f"Opening pages {batch[0]}-{batch[-1]}...")
+                for tab, current_page in zip(tabs, batch):
+                    responses = []
+                    tab_responses.append(responses)
+                    if self.extraction_mode == 'api':
+                        listener = self._response_collector(responses)
+                        tab.on("response", listener)
+                        listeners.append((tab, listener))
+                    with metrics.span('page.goto', info={'page': current_page}):
+                        tab.goto(search_url(keyword, current_page - 1, self.base_url), wait_until="commit", timeout=60000)
+
+                for tab, responses, current_page in zip(tabs, tab_responses, batch):
+                    print(f"\nProcessing page {current_page}...")
+                    tab.bring_to_front()
+                    with metrics.span('page.load', info={'page': current_page}):
+                        tab.wait_for_load_state("domcontentloaded")
+                    page_products = self._scrape_page(tab, responses, current_page)
+                    if not page_products:
+                        print("No more pages available")
+                        return
+                    print(f"Successfully scraped {len(page_products)} products on page {current_page}.")
+                    yield current_page, tab.url, page_products
+            finally:
+                for tab, listener in listeners:
+                    tab.remove_listener("response", listener)
+                for tab in tabs[1:]:
+                    self._close_tab(tab)
+
+    def _iter_pages_by_clicking(self, keyword, max_pages, settle=True, start_page=1):
+        # A page reused from a warm session has nothing left to load
+        if settle:
             self._human_like_delay(3, 5)
 
-            # Initialize database connection
-            db = DatabaseManager(DB_NAME)
-            table_name = f"products_{keyword.replace(' ', '_')}"
-            
-            # Check if table exists and clear it if it does
-            db.cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-            if db.cursor.fetchone():
-                db.clear_table(table_name)
-                db.create_table(keyword)
-            else:
-                # Create new table if it doesn't exist
-                db.create_table(keyword)
+        if start_page > 1:
+            # Resuming: jump straight to the first page that was not stored
+            print(f"Resuming '{keyword}' at page {start_page}...")
+            self._api_responses.clear()
+            with metrics.span('page.goto', info={'page': start_page}):
+                self.page.goto(search_url(keyword, start_page - 1, self.base_url), timeout=60000)
+            self._human_like_delay(2, 4)
+        else:
+            with metrics.span('search.typing'):
+                self._search_by_typing(keyword)
 
-            print(f"Searching for '{keyword}'...")
-            search_box = self.page.wait_for_selector(
-                "input.shopee-searchbar-input__input",
-                timeout=self.wait_time * 1000
-            )
-            self._move_mouse_naturally(search_box)
-            search_box.click()
-            self._human_like_delay(0.5, 1.2)
-            search_box.fill("")
-
-            for char in keyword:
-                search_box.press(char)
-                self._typing_delay()
-                if random.random() < 0.1:
-                    self._human_like_delay(0.5, 1.5)
-
-            print("Submitting search...")
-            search_btn = self.page.wait_for_selector(
-                "button.shopee-searchbar__search-button",
-                timeout=10000
-            )
-            search_btn.click()
-            self._human_like_delay(3, 6)
+        current_page = start_page
 
-            print("Sorting by Top Sales...")
-            try:
-                sort_btn = self.page.wait_for_selector(
-                    "button:has-text('Top Sales')",
-                    timeout=10000
-                )
-                sort_btn.click()
-                self._human_like_delay(2, 4)
-            except:
-                print("Could not find Top Sales button")
-                return []
+        while current_page <= max_pages:
+            print(f"\nProcessing page {current_page}...")
 
-            products = []
-            current_page = 1
+            page_products = self._scrape_page(self.page, self._api_responses, current_page)
 
-            while current_page <= max_pages:
-                print(f"\nProcessing page {current_page}...")
+            print(f"Successfully scraped {len(page_products)} products on page {current_page}.")
+            yield current_page, self.page.url, page_products
 
-                print(f"Loading more products... on page {current_page}")
-                for _ in range(6):
-                    self.page.mouse.wheel(0, random.randint(500, 1000))
-                    self._human_like_delay(1.5, 3)
-                
-                # Scrape products from the current page
-                print(f"Scraping product information on page {current_page}...")
-                soup = BeautifulSoup(self.page.content(), 'html.parser')
-
-                for card in soup.select('li.shopee-search-item-result__item'):
-                    try:
-                        name = card.select_one('div.line-clamp-2.break-words.min-w-0.min-h-\\[2\\.5rem\\].text-sm').get_text(strip=True)
-                        price = card.select_one('span.font-medium.text-base\\/5.truncate').get_text(strip=True)
-                        sold = card.select_one('div.truncate.text-shopee-black87.text-xs.min-h-4').get_text(strip=True)
-                        link = "https://shopee.ph" + card.select_one('a.contents')['href'].split('?')[0] 
-                        
-                        products.append({
-                            'name': name,
-                            'price': price,
-                            'sold': sold,
-                            'link': link
-                        })
-                    except Exception as e:
-                        print(f"Error scraping product: {e}")
-                        continue
-
-                print(f"Successfully scraped {len(products)} products on page {current_page}.")
-
-                # Check if there is a next page button
-                try:
-                    next_page_btn = self.page.wait_for_selector('.shopee-icon-button--right', timeout=3000)
-                    if not next_page_btn.is_enabled():
-                        print("No more pages available")
-                        break
-                        
-                    # Go to next page
-                    print("Moving to next page...")
-                    self._move_mouse_naturally(next_page_btn)
-                    next_page_btn.click()
-                    self._human_like_delay(2, 4)
-                    current_page += 1
-                    
-                except Exception as e:
-                    print(f"Failed to find next page button: {str(e)}")
+            # Check if there is a next page button
+            try:
+                next_page_btn = self.page.wait_for_selector('.shopee-icon-button--right', timeout=3000)
+                if not next_page_btn.is_enabled():
+                    print("No more pages available")
                     break
+                    
+                # Go to next page
+                print("Moving to next page...")
+                self._move_mouse_naturally(next_page_btn)
+                self._api_responses.clear()
+                with metrics.span('page.next', info={'page': current_page + 1}):
+                    next_page_btn.click()
+                self._human_like_delay(2, 4)
+                current_page += 1
+                
+            except Exception as e:
+                print(f"Failed to find next page button: {str(e)}")
+                break
+
+    def _search_by_typing(self, keyword):
+        print(f"Searching for '{keyword}'...")
+        if not self.page.url.startswith(self.base_url):
+            # A trusted session starts on a blank page
+            self.page.goto(self.base_url, timeout=60000)
+        search_box = self.page.wait_for_selector(
+            "input.shopee-searchbar-input__input",
+            timeout=self.wait_time * 1000
+        )
+        self._move_mouse_naturally(search_box)
+        search_box.click()
+        self._human_like_delay(0.5, 1.2)
+        search_box.fill("")
+
+        for char in keyword:
+            search_box.press(char)
+            self._typing_delay()
+            if random.random() < 0.1:
+                self._human_like_delay(0.5, 1.5)
 
-            print(f"\nTotal products scraped from {current_page - 1} pages: {len(products)}")
-            
-            db = DatabaseManager(DB_NAME)
-            for product in products:
-                db.insert_product(table_name, product)
+        print("Submitting search...")
+        search_btn = self.page.wait_for_selector(
+            "button.shopee-searchbar__search-button",
+            timeout=10000
+        )
+        search_btn.click()
+        self._human_like_delay(3, 6)
+
+        print("Sorting by Top Sales...")
+        try:
+            sort_btn = self.page.wait_for_selector(
+                "button:has-text('Top Sales')",
+                timeout=10000
+            )
+            self._api_responses.clear()
+            sort_btn.click()
+            self._human_like_delay(2, 4)
+        except:
+            raise RuntimeError("Could not find Top Sales button")
+
+    def search_and_scrape(self, keyword, max_pages, settle=True, on_page=None, resume=False):
+        """Scrape page by page, storing each page as soon as it is parsed.
+
+        on_page, if given, is called with every page's products after they
+        are committed. With resume, an unfinished run for keyword continues
+        at its first page without a checkpoint. Returns the number of
+        products stored.
+        """
+        with metrics.span('scrape', info={'keyword': keyword}):
+            return self._search_and_scrape(keyword, max_pages, settle, on_page, resume)
+
+    def _search_and_scrape(self, keyword, max_pages, settle, on_page, resume):
+        db = self.db if self.db is not None else shared_database(self.db_name)
+        resumable = db.get_resumable_run(keyword) if resume else None
+        if resumable is not None:
+            run_id, start_page = resumable
+            print(f"Resuming run {run_id} for '{keyword}' from page {start_page}")
+        else:
+            run_id, start_page = db.start_run(keyword), 1
+        self.run_status = 'running'
+        self.page_stats = []
+        if self.blocker is not None:
+            self.blocker.reset()
+        listener = None
+        if self.extraction_mode == 'api' and self.navigation_mode != 'url':
+            listener = self._response_collector(self._api_responses)
+            self.page.on("response", listener)
+        stored = 0
+        try:
+            if self.navigation_mode == 'url':
+                pages = self._iter_pages_by_url(keyword, max_pages, start_page)
+            else:
+                pages = self._iter_pages_by_clicking(keyword, max_pages, settle, start_page)
 
-            db.close()
-            return products
+            for current_page, cursor_url, page_products in pages:
+                stored += db.insert_page(run_id, current_page, page_products, cursor_url)
+                metrics.incr('pages_total')
+                metrics.incr('products_total', len(page_products))
+                if on_page is not None:
+                    on_page(page_products)
+
+            print(f"\nTotal products scraped: {stored}")
+            db.finish_run(run_id, 'completed')
+            self.run_status = 'completed'
+            return stored
 
         except Exception as e:
             print(f"Search and scrape failed: {str(e)}")
-            return []
+            db.finish_run(run_id, 'failed')
+            self.run_status = 'failed'
+            return stored
+        finally:
+            if listener is not None:
+                self.page.remove_listener("response", listener)
+            if self.blocker is not None:
+                print(self.blocker.summary())
+
+    def _start_session(self, username=None, password=None, trust_saved=True):
+        # A recently verified session needs no homepage visit
+        if trust_saved and self.session.is_fresh():
+            print(f"Using the session verified {(time.time() - self.session.verified_at()) / 60:.0f} min ago")
+            metrics.incr('session_checks_total', result='skipped')
+            return True
 
-    def scrape(self, keyword, username=None, password=None, max_pages=3):
+        verified = False
+        # Try to load cookies first
+        if self._load_cookies():
+            self.page.goto(self.base_url, timeout=60000)
+            self._human_like_delay(2, 4)
+            verified = self._is_logged_in()
+            
+            # If not logged in but we have credentials, do manual login
+            if not verified and username and password:
+                # The cookies were just tried, so go straight to the form
+                if not self.login(username, password, try_cookies=False):
+                    print("\n[ERROR] Login failed. Exiting.")
+                    return False
+                verified = True
+        
+        # If no cookies or login failed, try to login with credentials
+        elif username and password:
+            if not self.login(username, password):
+                print("\n[ERROR] Login failed. Exiting.")
+                return False
+            verified = True
+        
+        # If no cookies and no credentials, check the saved session state
+        else:
+            self.page.goto(self.base_url, timeout=60000)
+            if not self._is_logged_in():
+                print("\n[INFO] Not logged in and no credentials provided")
+                return False
+            verified = True
+
+        metrics.incr('session_checks_total', result='verified' if verified else 'unverified')
+        if verified:
+            self.session.save(self.page.context)
+        return True
+
+    def _search_with_session(self, keyword, username, password, max_pages, on_page, resume, settle=True):
+        stored = self.search_and_scrape(keyword, max_pages, settle=settle, on_page=on_page, resume=resume)
+        if not is_login_page(self.page.url):
+            return stored
+
+        # Shopee sent us to the login page, so the trusted session is stale:
+        # verify it (or log in) and pick the run up where it stopped
+        print("Session expired, logging in again...")
+        metrics.incr('session_expired_total')
+        self.session.invalidate()
+        if self.service is not None:
+            self.service.logged_in = False
+        if not self._start_session(username, password, trust_saved=False):
+            return stored
+        if self.service is not None:
+            self.service.mark_logged_in()
+        return stored + self.search_and_scrape(keyword, max_pages, on_page=on_page, resume=True)
+
+    def _scrape_in_service(self, keyword, username, password, max_pages, on_page, resume):
+        # Runs on the browser thread, which is the one cProfile has to watch
+        with profiled(PROFILE_FILE):
+            return self._scrape_with_service(keyword, username, password, max_pages, on_page, resume)
+
+    def _scrape_with_service(self, keyword, username, password, max_pages, on_page, resume):
+        self.page = self.service.acquire_page()
+        warm = self.service.logged_in and self.page.url.startswith(self.base_url)
+        if warm:
+            print("\nReusing warm browser session...")
+        else:
+            print("\nStarting Shopee scraping process...")
+            if not self._start_session(username, password):
+                return 0
+            self.service.mark_logged_in()
+
+        return self._search_with_session(keyword, username, password, max_pages, on_page, resume, settle=not warm)
+
+    def scrape(self, keyword, username=None, password=None, max_pages=3, on_page=None, resume=False):
+        """Log in if needed and scrape keyword; returns the number of products stored.
+
+        run_status tells whether the run finished, since a run that fails
+        partway still returns the products it stored.
+        """
+        self.run_status = None
         try:
-            with sync_playwright() as playwright:
+            if self.service is not None:
+                return self.service.run(self._scrape_in_service, keyword, username, password, max_pages,
+                                        on_page, resume)
+
+            with profiled(PROFILE_FILE), sync_playwright() as playwright:
                 self.playwright = playwright
-                self.browser = playwright.chromium.launch(
-                    headless=False,
-                    args=[
-                        f'--user-agent={self.user_agent}',
-                        '--no-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-blink-features=AutomationControlled',
-                        f'--lang={self.locale.split(",")[0]}',
-                        '--start-maximized'
-                    ],
-                    channel="msedge",
-                    chromium_sandbox=False,
-                    ignore_default_args=["--enable-automation"]
-                )
-                self.page = self.browser.new_page()
+                self.browser = launch_browser(playwright, self.user_agent, self.locale, self.headless, self.channel)
+                context = self.browser.new_context(storage_state=self.session.state())
+                self.page = context.new_page()
+                if self.blocker is not None:
+                    self.blocker.attach(self.page)
                 print("\nStarting Shopee scraping process...")
 
-                # Try to load cookies first
-                if self._load_cookies():
-                    self.page.goto("https://shopee.ph", timeout=60000)
-                    self._human_like_delay(2, 4)
-                    
-                    # If not logged in but we have credentials, do manual login
-                    if not self._is_logged_in() and username and password:
-                        if not self.login(username, password):
-                            print("\n[ERROR] Login failed. Exiting.")
-                            return []
-                
-                # If no cookies or login failed, try to login with credentials
-                elif username and password:
-                    if not self.login(username, password):
-                        print("\n[ERROR] Login failed. Exiting.")
-                        return []
-                
-                # If no cookies and no credentials, just proceed (will hit login page)
-                else:
-                    self.page.goto("https://shopee.ph", timeout=60000)
-                    if not self._is_logged_in():
-                        print("\n[INFO] Not logged in and no credentials provided")
-                        return []
+                if not self._start_session(username, password):
+                    return 0
                 
-                products = self.search_and_scrape(keyword, max_pages)
-                return products
+                return self._search_with_session(keyword, username, password, max_pages, on_page, resume)
 
         except Exception as e:
             print("\n[FATAL ERROR]", e)
-            return []
\ No newline at end of file
+            return 0
+        finally:
+            metrics.export(METRICS_FILE, PROMETHEUS_FILE)
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+import os
+import time
+from config import *
+
+
+class SessionManager:
+    """The saved Playwright login (storage_state) and when it was last verified.
+
+    Checking a session costs a homepage load and a wait for the avatar, so a
+    session verified less than ttl seconds ago is trusted as is. A search
+    that lands on the login page calls invalidate(), and the next scrape
+    verifies the session again. The verification time is kept next to the
+    state file, in <storage_state_file>.verified.
+    """
+
+    def __init__(self, storage_state_file=STORAGE_STATE_FILE, ttl=SESSION_TTL):
+        self.storage_state_file = storage_state_file
+        self.ttl = ttl
+        self.verified_file = f"{storage_state_file}.verified"
+
+    def state(self):
+        """The storage_state file for new_context(), or None if there is none"""
+        return self.storage_state_file if os.path.exists(self.storage_state_file) else None
+
+    def verified_at(self):
+        try:
+            with open(self.verified_file, 'r') as f:
+                return json.load(f)['verified_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_fresh(self):
+        """True if there is a saved session that was verified within the TTL"""
+        verified_at = self.verified_at()
+        return self.state() is not None and verified_at is not None and time.time() - verified_at < self.ttl
+
+    def save(self, context, verified=True):
+        """Save context's cookies and local storage; verified=True restarts the TTL"""
+        context.storage_state(path=self.storage_state_file)
+        if verified:
+            self.mark_verified()
+        print(f"Session state saved to: {self.storage_state_file}")
+
+    def mark_verified(self):
+        with open(self.verified_file, 'w') as f:
+            json.dump({'verified_at': time.time()}, f)
+
+    def invalidate(self):
+        """Keep the saved state but check it again before it is trusted"""
+        if os.path.exists(self.verified_file):
+            os.remove(self.verified_file)
+
+    def clear(self):
+        """Forget the session entirely, e.g. when the user deletes cookies"""
+        for path in (self.storage_state_file, self.verified_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def is_login_page(url):
+    """True if Shopee redirected the browser to the login page"""
+    return "/buyer/login" in (url or '')
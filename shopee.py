@@ -2,18 +2,42 @@ import threading
 import webbrowser
 import os
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from config import *
-from database import DatabaseManager
+from async_scraper import run_keywords
+from browser import BrowserService
+from database import shared_database
+from export import available_formats, export
+from queries import QueryExecutor, ResultCache
 from scraper import ShopeeScraper
+from widgets import KeysetPager, StaticRows, VirtualTreeview
 
 class GUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Shopee Price Scraper")
-        self.db = DatabaseManager(DB_NAME)
+        self.db = shared_database(DB_NAME)
+        # One browser for the whole session so later searches skip the startup
+        self.browser_service = BrowserService()
+        # Result queries run off the Tk thread; pagers for views already
+        # seen are reused until the keyword gets new data
+        self.queries = QueryExecutor(self.root)
+        self.result_cache = ResultCache()
         self.keyword = ""
+        # (status, pages_done) per job id as of the last poll of the queue
+        self._job_progress = {}
+        self._jobs_poll = None
         self.setup_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_jobs()
+
+    def on_close(self):
+        if self._jobs_poll is not None:
+            self.root.after_cancel(self._jobs_poll)
+        self.browser_service.close()
+        self.queries.close()
+        self.db.close()
+        self.root.destroy()
 
     def setup_gui(self):
         main_frame = ttk.Frame(self.root)
@@ -37,6 +61,8 @@ class GUI:
                                     width=3)
         refresh_tables_btn.pack(side="left")
 
+        ttk.Button(table_frame, text="Export...", command=self.export_results).pack(side="left", padx=5)
+
         search_frame = ttk.Frame(main_frame)
         search_frame.pack(fill="x", pady=10)
 
@@ -46,6 +72,9 @@ class GUI:
         search_button = ttk.Button(search_frame, text="Search", command=self.start_scraping)
         search_button.pack(side="left", padx=5)
 
+        # Queued searches are run by worker processes (python -m worker)
+        ttk.Button(search_frame, text="Add to queue", command=self.queue_search).pack(side="left", padx=5)
+
         delete_cookies_btn = ttk.Button(search_frame, text="Delete Cookies", 
                                       command=self.delete_cookies)
         delete_cookies_btn.pack(side="left", padx=5)
@@ -62,6 +91,28 @@ class GUI:
         self.password_entry = ttk.Entry(cred_frame, width=20, show="*")
         self.password_entry.pack(side="left", padx=5)
 
+        # Search every stored product by name, optionally within a price
+        # range (pesos) and above a sold count
+        find_frame = ttk.Frame(main_frame)
+        find_frame.pack(fill="x", pady=5)
+
+        ttk.Label(find_frame, text="Find in all searches:").pack(side="left")
+        self.find_entry = ttk.Entry(find_frame, width=30)
+        self.find_entry.pack(side="left", fill="x", expand=True, padx=5)
+        self.find_entry.bind("<Return>", lambda event: self.find_products())
+
+        ttk.Label(find_frame, text="₱ from").pack(side="left")
+        self.min_price_entry = ttk.Entry(find_frame, width=8)
+        self.min_price_entry.pack(side="left", padx=2)
+        ttk.Label(find_frame, text="to").pack(side="left")
+        self.max_price_entry = ttk.Entry(find_frame, width=8)
+        self.max_price_entry.pack(side="left", padx=2)
+        ttk.Label(find_frame, text="Min sold").pack(side="left")
+        self.min_sold_entry = ttk.Entry(find_frame, width=8)
+        self.min_sold_entry.pack(side="left", padx=2)
+
+        ttk.Button(find_frame, text="Find", command=self.find_products).pack(side="left", padx=5)
+
         self.sort_label = ttk.Label(main_frame, text="Sort by:")
         self.sort_label.pack(anchor="w", pady=5)
 
@@ -82,16 +133,17 @@ class GUI:
         # Add trace to automatically refresh when sorting option changes
         self.sort_variable.trace('w', lambda *args: self.refresh_data())
 
-        self.tree = ttk.Treeview(main_frame)
-        self.tree['columns'] = ('Name', 'Price', 'Sold', 'Link')
-    
-        self.tree.column("#0", width=0, stretch='no')
+        # Only the rows on screen exist in the Treeview; the rest are read
+        # from the database as the user scrolls
+        self.results = VirtualTreeview(main_frame, columns=('Name', 'Price', 'Sold', 'Link'),
+                                       loader=self.queries.submit)
+        self.tree = self.results.tree
+
         self.tree.column("Name", anchor='w', width=250)
         self.tree.column("Price", anchor='w', width=100)
         self.tree.column("Sold", anchor='w', width=100)
         self.tree.column("Link", anchor='w', width=200)
         
-        self.tree.heading("#0", text='', anchor='w')
         self.tree.heading('Name', text='Name', anchor='w')
         self.tree.heading('Price', text='Price', anchor='w')
         self.tree.heading('Sold', text='Sold', anchor='w')
@@ -100,7 +152,7 @@ class GUI:
         # Add click event handler
         self.tree.bind('<Button-1>', self.on_tree_click)
 
-        self.tree.pack(fill="both", expand=True, pady=10)
+        self.results.pack(fill="both", expand=True, pady=10)
 
         refresh_button = ttk.Button(main_frame, text="Refresh", command=self.refresh_data)
         refresh_button.pack(fill="x", pady=5)
@@ -115,22 +167,31 @@ class GUI:
         self.page_entry = ttk.Entry(page_frame, textvariable=self.page_var, width=5)
         self.page_entry.pack(side="left", padx=5)
 
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(page_frame, text="Resume interrupted run",
+                        variable=self.resume_var).pack(side="left", padx=5)
+
+        ttk.Label(main_frame, text="Queued searches (run them with: python -m worker):").pack(anchor="w")
+        self.jobs_tree = ttk.Treeview(main_frame, columns=('Keyword', 'Status', 'Pages', 'Items', 'Worker'),
+                                      show='headings', height=4)
+        for column, width in (('Keyword', 200), ('Status', 80), ('Pages', 60), ('Items', 60), ('Worker', 150)):
+            self.jobs_tree.heading(column, text=column, anchor='w')
+            self.jobs_tree.column(column, anchor='w', width=width)
+        self.jobs_tree.pack(fill="x", pady=5)
+
         self.refresh_table_list()
 
     def on_tree_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
         if region == "cell":
             column = self.tree.identify_column(event.x)
-            item = self.tree.focus()
+            item = self.tree.identify_row(event.y)
             if column == "#4":  # Link column
                 link = self.tree.item(item)['values'][3]
                 webbrowser.open(link)
 
     def refresh_table_list(self):
-        db = DatabaseManager(DB_NAME)
-        db.connect()
-        tables = db.get_all_product_tables()
-        db.close()
+        tables = self.db.get_keywords()
         
         self.table_dropdown['values'] = tables
         if tables:
@@ -146,7 +207,7 @@ class GUI:
             self.refresh_data()
     
     def delete_cookies(self):
-        scraper = ShopeeScraper(self.root)
+        scraper = ShopeeScraper(self.root, self.browser_service)
         if scraper.delete_cookies():
             messagebox.showinfo("Success", "Cookies deleted successfully")
         else:
@@ -173,7 +234,52 @@ class GUI:
         )
         scraping_thread.start()
 
+    def queue_search(self):
+        keywords = [k.strip() for k in self.search_entry.get().split(',') if k.strip()]
+        if not keywords:
+            messagebox.showerror("Error", "Please enter a search term")
+            return
+        try:
+            max_pages = int(self.page_var.get())
+        except ValueError:
+            max_pages = 3
+
+        def enqueue(db):
+            return [db.enqueue_job(keyword, max_pages) for keyword in keywords]
+        self.queries.submit(enqueue, lambda job_ids: self.poll_jobs())
+
+    def poll_jobs(self):
+        """Show the queue's progress, then check again in a couple of seconds"""
+        if self._jobs_poll is not None:
+            self.root.after_cancel(self._jobs_poll)
+            self._jobs_poll = None
+        self.queries.submit(lambda db: db.get_jobs(), self.show_jobs)
+
+    def show_jobs(self, jobs):
+        # Two polls can be in flight (e.g. "Add to queue" during a poll);
+        # keep a single follow-up so on_close can still cancel it
+        if self._jobs_poll is not None:
+            self.root.after_cancel(self._jobs_poll)
+        self._jobs_poll = self.root.after(2000, self.poll_jobs)
+        if jobs is None:
+            return
+
+        self.jobs_tree.delete(*self.jobs_tree.get_children())
+        finished = False
+        for job_id, keyword, status, pages_done, pages, items, attempts, owner, error in jobs:
+            self.jobs_tree.insert('', 'end', values=(keyword, error if status == 'failed' else status,
+                                                     f"{pages_done}/{pages}", items, owner or ''))
+            # A worker stored new pages: drop cached results, refreshing them if on screen
+            previous = self._job_progress.get(job_id)
+            if previous is not None and previous != (status, pages_done):
+                self.on_page_stored(keyword)
+                finished = finished or status == 'done'
+            self._job_progress[job_id] = (status, pages_done)
+        if finished:
+            self.refresh_table_list()
+
     def scrape_products(self, keyword, username=None, password=None):
+        # Runs on the scraping thread; anything that touches Tk goes through root.after
         try:
             # Get page count from GUI
             try:
@@ -181,51 +287,103 @@ class GUI:
             except ValueError:
                 max_pages = 3
 
-            # Initialize the scraper
-            scraper = ShopeeScraper(self.root)
-        
-            if not os.path.exists(COOKIE_FILE) and username and password:
-                results = scraper.scrape(keyword, username, password, max_pages)
+            resume = self.resume_var.get()
+
+            # Several comma-separated keywords are scraped concurrently
+            keywords = [k.strip() for k in keyword.split(',') if k.strip()]
+            if len(keywords) > 1:
+                keyword = keywords[0]
+                counts = run_keywords(keywords, max_pages, resume)
+                print(f"Scraped {sum(counts.values())} products for {len(keywords)} keywords")
             else:
-                results = scraper.scrape(keyword, max_pages=max_pages)
-            
-            # Update the GUI with the results
-            self.update_gui(results)
-            
-            # Store the current keyword for sorting/refresh
-            self.keyword = keyword
+                # Each page is shown as soon as it has been stored
+                def on_page(products):
+                    self.root.after(0, self.on_page_stored, keyword)
 
-            # After successful scrape, refresh table list
-            self.refresh_table_list()
+                # Initialize the scraper
+                scraper = ShopeeScraper(self.root, self.browser_service)
             
-            # Auto-select the newly created table
-            self.table_var.set(keyword)
-            self.load_selected_table()
+                if not os.path.exists(COOKIE_FILE) and username and password:
+                    scraper.scrape(keyword, username, password, max_pages, on_page=on_page, resume=resume)
+                else:
+                    scraper.scrape(keyword, max_pages=max_pages, on_page=on_page, resume=resume)
 
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred during scraping: {str(e)}")
+            error = str(e)
+            self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred during scraping: {error}"))
         finally:
-            self.scraping_in_progress = False
-            self.search_entry.config(state="normal")
+            self.root.after(0, self.finish_scraping, keyword)
+
+    def finish_scraping(self, keyword):
+        self.scraping_in_progress = False
+        self.search_entry.config(state="normal")
+
+        # Store the current keyword for sorting/refresh
+        self.keyword = keyword
+
+        # Refresh the saved searches and select the one just scraped
+        self.refresh_table_list()
+        self.table_var.set(keyword)
+        self.load_selected_table()
 
-    def update_gui(self, products):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+    def find_products(self):
+        text = self.find_entry.get()
+        if not text.strip():
+            self.refresh_data()
+            return
+
+        def number(entry, convert):
+            value = entry.get().strip().replace(',', '')
+            return convert(value) if value else None
+
+        try:
+            min_price = number(self.min_price_entry, float)
+            max_price = number(self.max_price_entry, float)
+            min_sold = number(self.min_sold_entry, int)
+        except ValueError:
+            messagebox.showerror("Error", "Price and sold filters must be numbers")
+            return
 
-        for product in products:
-            self.tree.insert('', 'end', values=(product['name'], product['price'], product['sold']))
+        def search(db):
+            return db.search_products(text, min_price, max_price, min_sold)
+
+        def show(rows):
+            if rows is not None:
+                self.results.set_source(StaticRows(rows))
+        self.queries.submit(search, show)
+
+    def export_results(self):
+        """Export the selected saved search's history (every search if none is selected)"""
+        keyword = self.table_var.get() or None
+        filetypes = [(f"{name.upper()} files", f"*.{name}") for name in available_formats()]
+        path = filedialog.asksaveasfilename(title="Export results", defaultextension=".csv", filetypes=filetypes,
+                                            initialfile=f"{keyword or 'all_searches'}.csv")
+        if not path:
+            return
 
-    def refresh_data(self):
+        # Exports can be large, so they get their own thread and connection
+        # instead of holding up the result queries
+        def run():
+            try:
+                count = export(self.db, path, keyword=keyword)
+                self.root.after(0, lambda: messagebox.showinfo("Export", f"Exported {count} rows to {path}"))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Error", f"Export failed: {error}"))
+            finally:
+                self.db.close_thread()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def on_page_stored(self, keyword):
+        self.result_cache.invalidate(keyword)
+        if keyword == self.keyword:
+            self.refresh_data(keep_position=True)
+
+    def refresh_data(self, keep_position=False):
         if not hasattr(self, 'keyword') or not self.keyword:
             return
-            
-        for row in self.tree.get_children():
-            self.tree.delete(row)
 
-        # Create new database connection for this operation
-        db = DatabaseManager(DB_NAME)
-        db.connect()
-        
         sort_mapping = {
             "default (original order)": "default",
             "price (low to high)": "price_low_to_high",
@@ -236,15 +394,29 @@ class GUI:
         
         sort_option = sort_mapping.get(self.sort_variable.get(), "default")
         
-        products = db.get_products(
-            f"products_{self.keyword.replace(' ', '_')}",
-            sort_option
-        )
+        keyword = self.keyword
+        self.queries.submit(lambda db: db.get_data_version(keyword),
+                            lambda version: self.show_results(keyword, sort_option, version, keep_position))
 
-        for product in products:
-            self.tree.insert('', 'end', values=product)
-            
-        db.close()
+    def show_results(self, keyword, sort_option, version, keep_position=False):
+        if version is None:
+            return
+        key = (keyword, sort_option, version)
+        pager = self.result_cache.get(key)
+        if pager is not None:
+            self.results.set_source(pager, keep_position)
+            return
+
+        def load(db):
+            pager = KeysetPager(keyword, sort_option)
+            pager.prepare(db)
+            return pager
+
+        def loaded(pager):
+            if pager is not None:
+                self.result_cache.put(key, pager)
+                self.results.set_source(pager, keep_position)
+        self.queries.submit(load, loaded)
 
 if __name__ == "__main__":
     root = tk.Tk()
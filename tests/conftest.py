@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to this directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import DatabaseManager
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+
+
+def make_products(page, count=5, price=100):
+    """count product records for results page `page`, with item ids unique per page"""
+    return [{'name': f"Item {page}-{i}", 'price': f"₱{price + i}", 'sold': f"{i * 10} sold",
+             'link': f"https://shopee.ph/product/7/{page * 100 + i}", 'item_id': page * 100 + i, 'shop_id': 7}
+            for i in range(count)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "test.db"))
+    yield db
+    db.close()
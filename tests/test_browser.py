@@ -0,0 +1,51 @@
+import threading
+
+from browser import BrowserService
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+    def new_context(self, storage_state=None):
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+
+def test_reset_session_does_not_wait_for_a_running_task(tmp_path):
+    service = BrowserService(storage_state_file=str(tmp_path / "state.json"))
+    service.browser = FakeBrowser()
+    service._new_context()
+    service.logged_in = True
+    first = service.context
+
+    started, release = threading.Event(), threading.Event()
+    task = threading.Thread(target=service.run, args=(lambda: started.set() or release.wait(5),))
+    task.start()
+    assert started.wait(5)
+
+    # Returns straight away although the browser thread is busy
+    service.reset_session()
+    assert not service.logged_in
+    assert not first.closed
+    release.set()
+    task.join()
+
+    # The next task gets a fresh context
+    assert service.run(lambda: service.context) is not first
+    assert first.closed
+    service.close()
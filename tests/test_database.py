@@ -0,0 +1,137 @@
+import sqlite3
+
+import pytest
+
+from conftest import make_products
+from database import _SORT_KEYS, DatabaseManager, parse_price, parse_sold
+
+
+def run_status(db, run_id):
+    db.cursor.execute("SELECT status FROM scrape_runs WHERE id = ?", (run_id,))
+    return db.cursor.fetchone()[0]
+
+
+def test_resume_starts_at_first_missing_page(db):
+    run_id = db.start_run("phone")
+    for page in (1, 2, 4):
+        db.insert_page(run_id, page, make_products(page))
+    db.finish_run(run_id, 'failed')
+
+    assert db.get_resumable_run("phone") == (run_id, 3)
+    assert run_status(db, run_id) == 'running'
+
+
+def test_resume_without_checkpoints_starts_at_page_one(db):
+    run_id = db.start_run("phone")
+    db.finish_run(run_id, 'failed')
+    assert db.get_resumable_run("phone") == (run_id, 1)
+
+
+def test_completed_run_is_not_resumed(db):
+    run_id = db.start_run("phone")
+    db.insert_page(run_id, 1, make_products(1))
+    db.finish_run(run_id, 'completed')
+    assert db.get_resumable_run("phone") is None
+    assert db.get_resumable_run("unknown") is None
+
+
+@pytest.mark.parametrize("sort_option", sorted(_SORT_KEYS))
+def test_keyset_pages_match_get_products(db, sort_option):
+    # Repeated prices and sold counts, so paging has to break ties by id
+    products = [{'name': f"Item {i}", 'price': f"₱{100 + i % 3}", 'sold': f"{i % 4 * 10} sold",
+                 'link': f"https://shopee.ph/product/7/{i}", 'item_id': i, 'shop_id': 7} for i in range(1, 48)]
+    run_id = db.start_run("phone")
+    db.insert_page(run_id, 1, products)
+    db.finish_run(run_id, 'completed')
+
+    rows = []
+    after = None
+    while True:
+        page = db.get_products_page(run_id, sort_option, after=after, limit=10)
+        if not page:
+            break
+        rows.extend(row for row, _ in page)
+        after = page[-1][1]
+
+    assert len(rows) == len(products)
+    assert rows == db.get_products("phone", sort_option)
+
+
+def test_price_backfill_runs_once(tmp_path):
+    path = str(tmp_path / "test.db")
+    db = DatabaseManager(path)
+    db.cursor.execute("PRAGMA user_version")
+    assert db.cursor.fetchone()[0] == 1
+    run_id = db.start_run("phone")
+    db.insert_page(run_id, 1, make_products(1, count=1))
+    with db.transaction():
+        db.cursor.execute("UPDATE observations SET price_min = NULL")
+    db.close()
+
+    # A second open must not scan observations again
+    db = DatabaseManager(path)
+    db.cursor.execute("SELECT price_min FROM observations")
+    assert db.cursor.fetchall() == [(None,)]
+    db.close()
+
+
+def create_legacy_table(path, table_name, links):
+    conn = sqlite3.connect(path)
+    conn.execute(f"""CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+                     price TEXT NOT NULL, sold TEXT NOT NULL, link TEXT NOT NULL,
+                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+    conn.executemany(f"INSERT INTO {table_name} (name, price, sold, link) VALUES (?, '₱100', '5 sold', ?)",
+                     [(f"Item {i}", link) for i, link in enumerate(links)])
+    conn.commit()
+    conn.close()
+
+
+def table_names(db):
+    db.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%products\\_%' ESCAPE '\\'")
+    return {name for (name,) in db.cursor.fetchall()}
+
+
+def test_legacy_import_keeps_tables_with_unimported_rows(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    create_legacy_table(path, "products_phone_case", ["https://shopee.ph/a-i.1.11", "https://shopee.ph/b-i.1.12",
+                                                      "https://shopee.ph/no-item-id"])
+    create_legacy_table(path, "products_charger", ["https://shopee.ph/c-i.2.21"])
+
+    db = DatabaseManager(path)
+    assert table_names(db) == {"legacy_products_phone_case"}
+    db.cursor.execute("SELECT COUNT(*) FROM legacy_products_phone_case")
+    assert db.cursor.fetchone()[0] == 3
+    assert len(db.get_products("phone case")) == 2
+    assert len(db.get_products("charger")) == 1
+    db.close()
+
+    # The kept table is not imported a second time
+    db = DatabaseManager(path)
+    db.cursor.execute("SELECT COUNT(*) FROM scrape_runs")
+    assert db.cursor.fetchone()[0] == 2
+    db.close()
+
+
+@pytest.mark.parametrize("text, count", [
+    ("1,234 sold", 1234),
+    ("1.2k+ sold", 1200),
+    ("12K sold", 12000),
+    ("3 M sold", 3000000),
+    ("1,234 sold/month", 1234),
+    ("12 monthly sold", 12),
+    ("5 months", 5),
+    ("", 0),
+    (None, 0),
+])
+def test_parse_sold(text, count):
+    assert parse_sold(text) == count
+
+
+@pytest.mark.parametrize("text, prices", [
+    ("₱1,299", (129900, 129900)),
+    ("₱100 - ₱250", (10000, 25000)),
+    ("₱1.5k", (150000, 150000)),
+    ("Free", (None, None)),
+])
+def test_parse_price(text, prices):
+    assert parse_price(text) == prices
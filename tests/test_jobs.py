@@ -0,0 +1,177 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import worker
+from conftest import make_products
+from coordinator import RemoteDatabase, make_server
+from database import DatabaseManager
+
+
+def job_row(db, job_id):
+    db.cursor.execute("SELECT status, attempts, lease_owner, error FROM jobs WHERE id = ?", (job_id,))
+    return db.cursor.fetchone()
+
+
+def drain(db_name):
+    # Runs in a spawned process: lease and finish jobs until none are left
+    db = DatabaseManager(db_name)
+    owner = multiprocessing.current_process().name
+    leased = []
+    while True:
+        job = db.lease_job(owner)
+        if job is None:
+            break
+        leased.append(job[0])
+        db.finish_job(job[0], owner, items=1)
+    db.close()
+    return leased
+
+
+def test_concurrent_workers_lease_each_job_once(db):
+    job_ids = [db.enqueue_job(f"keyword {i}") for i in range(60)]
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        leased = pool.map(drain, [db.db_name] * 4)
+
+    assert sorted(job_id for ids in leased for job_id in ids) == job_ids
+    db.cursor.execute("SELECT COUNT(*) FROM jobs WHERE status = 'done' AND attempts = 1")
+    assert db.cursor.fetchone()[0] == 60
+
+
+def test_expired_lease_is_taken_over(db):
+    job_id = db.enqueue_job("phone")
+    assert db.lease_job("a", lease_seconds=-1) == (job_id, "phone", 3, 1)
+
+    assert db.lease_job("b") == (job_id, "phone", 3, 2)
+    assert not db.renew_lease(job_id, "a")
+    db.finish_job(job_id, "a", items=5)
+    assert job_row(db, job_id) == ('running', 2, "b", None)
+
+    assert db.renew_lease(job_id, "b", pages_done=1, items=5)
+    db.finish_job(job_id, "b", items=5)
+    assert job_row(db, job_id) == ('done', 2, None, None)
+
+
+def test_expired_lease_fails_after_last_attempt(db):
+    job_id = db.enqueue_job("phone", max_attempts=1)
+    db.lease_job("a", lease_seconds=-1)
+    assert db.lease_job("b") is None
+    assert job_row(db, job_id) == ('failed', 1, None, 'lease expired')
+
+
+def test_release_does_not_use_an_attempt(db):
+    job_id = db.enqueue_job("phone")
+    db.lease_job("a")
+    db.release_job(job_id, "a")
+    assert job_row(db, job_id) == ('queued', 0, None, None)
+
+
+class FakeScraper:
+    """Stands in for ShopeeScraper: stores `pages` pages through db, failing at fail_at"""
+    fail_at = None
+    steal_at = None
+
+    def __init__(self, db, **kwargs):
+        self.db = db
+        self.run_status = None
+
+    def scrape(self, keyword, max_pages, on_page, resume):
+        resumable = self.db.get_resumable_run(keyword) if resume else None
+        run_id, start_page = resumable if resumable else (self.db.start_run(keyword), 1)
+        stored = 0
+        try:
+            for page in range(start_page, max_pages + 1):
+                if page == self.fail_at:
+                    raise RuntimeError("page failed to load")
+                if page == self.steal_at:
+                    self.db.cursor.execute("UPDATE jobs SET lease_owner = 'thief'")
+                    self.db.conn.commit()
+                products = make_products(page)
+                stored += self.db.insert_page(run_id, page, products)
+                on_page(products)
+            self.db.finish_run(run_id, 'completed')
+            self.run_status = 'completed'
+        except Exception:
+            self.db.finish_run(run_id, 'failed')
+            self.run_status = 'failed'
+        return stored
+
+
+@pytest.fixture
+def fake_scraper(monkeypatch):
+    monkeypatch.setattr(worker, "ShopeeScraper", FakeScraper)
+    monkeypatch.setattr(FakeScraper, "fail_at", None)
+    monkeypatch.setattr(FakeScraper, "steal_at", None)
+    return FakeScraper
+
+
+def test_partial_scrape_fails_the_job_and_retry_resumes(db, fake_scraper):
+    job_id = db.enqueue_job("phone", pages=4)
+    fake_scraper.fail_at = 3
+    worker.run_job(db, db.lease_job("w"), "w")
+    assert job_row(db, job_id) == ('queued', 1, None, 'scrape run failed')
+
+    fake_scraper.fail_at = None
+    worker.run_job(db, db.lease_job("w"), "w")
+    assert job_row(db, job_id) == ('done', 2, None, None)
+    db.cursor.execute("SELECT COUNT(*), COUNT(DISTINCT run_id) FROM run_pages")
+    assert db.cursor.fetchone() == (4, 1)
+
+
+def test_lost_lease_stops_the_scrape(db, fake_scraper):
+    job_id = db.enqueue_job("phone", pages=5)
+    fake_scraper.steal_at = 2
+    worker.run_job(db, db.lease_job("w"), "w")
+
+    # Page 2 was stored before on_page noticed; nothing after it
+    db.cursor.execute("SELECT COUNT(*) FROM run_pages")
+    assert db.cursor.fetchone()[0] == 2
+    assert job_row(db, job_id) == ('running', 1, 'thief', None)
+
+
+@pytest.fixture
+def coordinator_url(db):
+    server = make_server(db.db_name, '127.0.0.1', 0, token="secret")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_worker_runs_jobs_through_the_coordinator(db, coordinator_url, fake_scraper):
+    job_ids = [db.enqueue_job("phone", pages=2), db.enqueue_job("case", pages=3)]
+    worker.work(once=True, coordinator=coordinator_url, token="secret")
+
+    assert [job_row(db, job_id)[0] for job_id in job_ids] == ['done', 'done']
+    db.cursor.execute("SELECT COUNT(*) FROM run_pages")
+    assert db.cursor.fetchone()[0] == 5
+
+
+def test_coordinator_rejects_a_bad_token(db, coordinator_url):
+    db.enqueue_job("phone")
+    remote = RemoteDatabase(coordinator_url, token="wrong")
+    assert remote.lease_job("w") is None
+    assert remote.renew_lease(1, "w") is False
+    assert job_row(db, 1)[0] == 'queued'
+
+
+def test_coordinator_needs_a_token_off_loopback(db):
+    with pytest.raises(ValueError):
+        make_server(db.db_name, '0.0.0.0', 0)
+    server = make_server(db.db_name, '127.0.0.1', 0)
+    server.server_close()
+
+
+def test_stalled_scrape_stops_renewing(db):
+    job_id = db.enqueue_job("phone")
+    db.lease_job("w", lease_seconds=0.3)
+    keeper = worker.LeaseKeeper(db, job_id, "w", lease_seconds=0.3, stall_seconds=0.5)
+    keeper.start()
+    keeper.join(5)
+
+    assert keeper.lost
+    time.sleep(0.4)  # the last renewal runs out
+    assert db.lease_job("other") == (job_id, "phone", 3, 2)
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from conftest import FIXTURES
+from database import parse_price
+from parsers import available_backends, is_captcha_url, parse_search_html, parse_search_items
+
+
+@pytest.fixture(scope="module")
+def api_products():
+    with open(os.path.join(FIXTURES, "search_items.json"), encoding="utf-8") as f:
+        return parse_search_items(json.load(f))
+
+
+@pytest.fixture(scope="module")
+def html():
+    with open(os.path.join(FIXTURES, "search_page.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_api_fixture_parses_every_item(api_products):
+    assert len(api_products) == 60
+    for product in api_products:
+        assert product['link'] == f"https://shopee.ph/product/{product['shop_id']}/{product['item_id']}"
+        assert 0 < product['price_min'] <= product['price_max']
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_html_matches_api(backend, html, api_products):
+    dom_products = parse_search_html(html, backend)
+
+    assert [p['item_id'] for p in dom_products] == [p['item_id'] for p in api_products]
+    assert [p['shop_id'] for p in dom_products] == [p['shop_id'] for p in api_products]
+    assert [p['name'] for p in dom_products] == [p['name'] for p in api_products]
+    assert [p['link'] for p in dom_products] == [p['link'] for p in api_products]
+    # The page shows prices without the API's formatting; compare the values
+    assert [parse_price(p['price']) for p in dom_products] == \
+        [(p['price_min'], p['price_max']) for p in api_products]
+
+
+def test_backends_agree(html):
+    results = {backend: parse_search_html(html, backend) for backend in available_backends()}
+    first = results.pop('bs4')
+    for backend, products in results.items():
+        assert products == first, backend
+
+
+def test_unknown_backend(html):
+    with pytest.raises(ValueError):
+        parse_search_html(html, 'nope')
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://shopee.ph/verify/traffic?is_initial=true", True),
+    ("https://shopee.ph/verify/captcha", True),
+    ("https://shopee.ph/search?keyword=phone", False),
+    (None, False),
+])
+def test_is_captcha_url(url, expected):
+    assert is_captcha_url(url) is expected
@@ -0,0 +1,200 @@
+from collections import OrderedDict
+from tkinter import ttk
+
+
+class KeysetPager:
+    """Reads one run's products in sort order, a block of rows at a time.
+
+    Blocks are fetched with keyset pagination: the sort key of the last row
+    of each block is kept as a bookmark, so the next block starts with an
+    index seek instead of an OFFSET that grows with the table. A jump past
+    the known bookmarks (e.g. dragging the scrollbar) offsets from the
+    nearest one, and every block read adds a bookmark.
+
+    Reads happen on a background thread through load_task(); only store()
+    and rows() touch the cached blocks, and both run on the Tk thread.
+    """
+
+    def __init__(self, keyword, sort_option='default', block_size=100, cached_blocks=8):
+        self.keyword = keyword
+        self.sort_option = sort_option
+        self.block_size = block_size
+        self.cached_blocks = cached_blocks
+        self.run_id = None
+        self.total = 0
+        # block index -> sort key of the last row before that block
+        self._bookmarks = {0: None}
+        self._blocks = OrderedDict()
+
+    def prepare(self, db):
+        """Find the run to show and read its first block, before the pager is shared"""
+        self.run_id = db.get_latest_run(self.keyword)
+        self.total = db.get_run_size(self.run_id) if self.run_id is not None else 0
+        self.store(self._read(db, [0], dict(self._bookmarks)))
+
+    def _block_range(self, start, count):
+        end = min(start + count, self.total)
+        if self.run_id is None or end <= start:
+            return range(0)
+        return range(start // self.block_size, (end - 1) // self.block_size + 1)
+
+    def _read(self, db, indexes, bookmarks):
+        blocks = {}
+        for index in indexes:
+            known = max(i for i in bookmarks if i <= index)
+            rows = db.get_products_page(self.run_id, self.sort_option, bookmarks[known],
+                                        self.block_size, (index - known) * self.block_size)
+            if rows:
+                bookmarks[index + 1] = rows[-1][1]
+            blocks[index] = rows
+        return blocks
+
+    def load_task(self, start, count):
+        """Return a task(db) that reads the blocks rows(start, count) is missing"""
+        missing = [index for index in self._block_range(start, count) if index not in self._blocks]
+        bookmarks = dict(self._bookmarks)
+        return lambda db: self._read(db, missing, bookmarks)
+
+    def store(self, blocks):
+        for index, rows in blocks.items():
+            if rows:
+                self._bookmarks[index + 1] = rows[-1][1]
+            self._blocks[index] = [row for row, _ in rows]
+            self._blocks.move_to_end(index)
+        while len(self._blocks) > max(self.cached_blocks, len(blocks)):
+            self._blocks.popitem(last=False)
+
+    def rows(self, start, count):
+        """Return up to count display rows from position start, or None if not loaded yet"""
+        blocks = self._block_range(start, count)
+        # Touch the blocks already here so loading the rest does not evict them
+        for index in blocks:
+            if index in self._blocks:
+                self._blocks.move_to_end(index)
+        if any(index not in self._blocks for index in blocks):
+            return None
+        rows = []
+        for index in blocks:
+            rows.extend(self._blocks[index])
+        offset = start - blocks[0] * self.block_size if blocks else 0
+        return rows[offset:offset + count]
+
+
+class StaticRows:
+    """A VirtualTreeview source over rows already in memory, e.g. search results"""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self.total = len(rows)
+
+    def rows(self, start, count):
+        return self._rows[start:start + count]
+
+
+class VirtualTreeview(ttk.Frame):
+    """A Treeview that only holds the rows currently on screen.
+
+    The rows come from a source such as KeysetPager. Rows it has not
+    loaded yet are read through loader(task, callback), which runs the
+    task off the Tk thread (see QueryExecutor.submit); the old rows stay on
+    screen until they arrive. Scrolling reuses the same items and only
+    changes their values, so the cost of a redraw depends on the window
+    height, not on the number of rows.
+    """
+
+    def __init__(self, master, columns, loader, **kwargs):
+        super().__init__(master, **kwargs)
+        self.loader = loader
+        self._loading = False
+        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.source = None
+        self.first = 0
+        self.visible = 20
+
+        self.tree.bind('<Configure>', self._on_resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self._on_wheel)
+        self.tree.bind('<Prior>', lambda event: self._scroll_by(-self.visible))
+        self.tree.bind('<Next>', lambda event: self._scroll_by(self.visible))
+
+    def set_source(self, source, keep_position=False):
+        """Show rows from source; starts at the top unless keep_position is set"""
+        self.source = source
+        if not keep_position:
+            self.first = 0
+            self.tree.selection_set(())
+        self.scroll_to(self.first)
+
+    def scroll_to(self, first):
+        total = self.source.total if self.source is not None else 0
+        self.first = max(0, min(first, total - self.visible))
+        self._render()
+
+    def _scroll_by(self, rows):
+        self.scroll_to(self.first + rows)
+        return 'break'
+
+    def _render(self):
+        rows = self.source.rows(self.first, self.visible) if self.source is not None else []
+        if rows is None:
+            self._request_rows()
+            return
+
+        items = self.tree.get_children()
+        for i, row in enumerate(rows):
+            if i < len(items):
+                self.tree.item(items[i], values=row)
+            else:
+                self.tree.insert('', 'end', iid=f"row{i}", values=row)
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+
+        total = self.source.total if self.source is not None else 0
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + len(rows)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _request_rows(self):
+        # One read at a time; whatever is on screen when it lands is rendered next
+        if self._loading:
+            return
+        self._loading = True
+        source = self.source
+
+        def loaded(blocks):
+            self._loading = False
+            if blocks is None:
+                return
+            if source is self.source:
+                source.store(blocks)
+            self._render()
+        self.loader(source.load_task(self.first, self.visible), loaded)
+
+    def _row_height(self):
+        height = ttk.Style().lookup('Treeview', 'rowheight')
+        return int(height) if height else 20
+
+    def _on_resize(self, event):
+        # Leave room for the heading row
+        visible = max(1, (event.height - self._row_height() - 4) // self._row_height())
+        if visible != self.visible:
+            self.visible = visible
+            self.scroll_to(self.first)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        total = self.source.total if self.source is not None else 0
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * total))
+        elif action == 'scroll':
+            step = self.visible if unit == 'pages' else 1
+            self.scroll_to(self.first + int(amount) * step)
+
+    def _on_wheel(self, event):
+        # Button-4/5 are the wheel on X11; delta is used on Windows and macOS
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        return self._scroll_by(-3 if up else 3)
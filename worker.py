@@ -0,0 +1,185 @@
+"""Scrape queued searches from the jobs table, in one or more processes.
+
+Usage: python -m worker [--processes 2] [--db shopee_products.db] [--headed] [--once]
+       python -m worker --coordinator http://<host>:8765 [--token SECRET] [--processes 2]
+
+Searches are queued from the GUI ("Add to queue") or with
+DatabaseManager.enqueue_job(). Each process runs its own browser and
+claims one job at a time; start as many as the machine has cores and
+memory for, and more worker commands can point at the same database. A
+job whose worker crashes is picked up again once its lease expires.
+
+SQLite's WAL mode needs every process that opens the file on the same
+host. To add machines, run python -m coordinator next to the database
+and start workers elsewhere with --coordinator: they lease jobs and
+store pages through it instead of opening the file.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from config import *
+from coordinator import RemoteDatabase
+from database import shared_database
+from scraper import ShopeeScraper, wait_for_captcha
+
+
+class LeaseLost(Exception):
+    """Raised from on_page to stop a scrape whose job another worker may now hold"""
+
+
+class LeaseKeeper(threading.Thread):
+    """Renews a job's lease in the background while the scrape makes progress.
+
+    If no page is stored for stall_seconds (see progressed()), the scrape
+    is taken to be hung and renewing stops, so the lease expires and
+    another worker picks the job up.
+    """
+
+    def __init__(self, db, job_id, owner, lease_seconds=JOB_LEASE_SECONDS, stall_seconds=JOB_STALL_SECONDS):
+        super().__init__(daemon=True)
+        self.db = db
+        self.job_id = job_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.stall_seconds = stall_seconds
+        self.lost = False
+        self._last_progress = time.monotonic()
+        self._stopping = threading.Event()
+
+    def progressed(self):
+        self._last_progress = time.monotonic()
+
+    def run(self):
+        # Renew well before expiry so one slow write cannot lose the lease
+        while not self._stopping.wait(self.lease_seconds / 3):
+            if time.monotonic() - self._last_progress > self.stall_seconds:
+                print(f"No progress on job {self.job_id} for {self.stall_seconds}s; letting its lease expire")
+                self.lost = True
+                break
+            if not self.db.renew_lease(self.job_id, self.owner, self.lease_seconds):
+                print(f"Lost the lease on job {self.job_id}; another worker may take it over")
+                self.lost = True
+                break
+        self.db.close_thread()
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+
+def run_job(db, job, owner, headless=True, channel=None, captcha_timeout=0, lease_seconds=JOB_LEASE_SECONDS,
+            stall_seconds=JOB_STALL_SECONDS):
+    job_id, keyword, pages, attempt = job
+    print(f"[{owner}] job {job_id}: '{keyword}', {pages} pages (attempt {attempt})")
+    # A page may legitimately wait out a whole CAPTCHA timeout
+    keeper = LeaseKeeper(db, job_id, owner, lease_seconds, stall_seconds + captcha_timeout)
+    keeper.start()
+    progress = {'pages': 0, 'items': 0}
+
+    def on_page(products):
+        progress['pages'] += 1
+        progress['items'] += len(products)
+        keeper.progressed()
+        # Raising stops the scrape at this page; the run is left for
+        # whichever worker now holds the job to resume
+        if keeper.lost or not db.renew_lease(job_id, owner, lease_seconds, progress['pages'], progress['items']):
+            keeper.lost = True
+            raise LeaseLost(f"lost the lease on job {job_id}")
+
+    try:
+        scraper = ShopeeScraper(headless=headless, channel=channel, db=db,
+                                captcha_handler=lambda page: wait_for_captcha(page, captcha_timeout))
+        # Resume so a retried job continues the run its last attempt left
+        stored = scraper.scrape(keyword, max_pages=pages, on_page=on_page, resume=attempt > 1)
+    finally:
+        keeper.stop()
+
+    if keeper.lost:
+        print(f"[{owner}] job {job_id} abandoned after losing its lease")
+        return
+    if scraper.run_status != 'completed':
+        # Failed partway (or never started): retrying resumes from the checkpoint
+        error = f"scrape run {scraper.run_status}" if scraper.run_status else "scrape did not start"
+        db.finish_job(job_id, owner, error=error)
+        print(f"[{owner}] job {job_id} failed after {stored} products: {error}")
+    elif stored:
+        db.finish_job(job_id, owner, items=stored)
+        print(f"[{owner}] job {job_id} done: {stored} products")
+    else:
+        db.finish_job(job_id, owner, error="no products stored")
+        print(f"[{owner}] job {job_id} failed")
+
+
+def work(db_name=DB_NAME, headless=True, channel=None, once=False, captcha_timeout=0,
+         poll_interval=JOB_POLL_INTERVAL, coordinator=None, token=COORDINATOR_TOKEN):
+    """Lease and run jobs until interrupted (or, with once, until the queue is empty).
+
+    With coordinator (its URL), jobs and results go through python -m
+    coordinator instead of the database file db_name.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    db = RemoteDatabase(coordinator, token) if coordinator else shared_database(db_name)
+    job = None
+    try:
+        while True:
+            job = db.lease_job(owner)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            run_job(db, job, owner, headless, channel, captcha_timeout)
+            job = None
+    except KeyboardInterrupt:
+        if job is not None:
+            db.release_job(job[0], owner)
+            print(f"[{owner}] returned job {job[0]} to the queue")
+    finally:
+        db.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m worker", description="Run queued Shopee searches")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes, each with its own browser")
+    parser.add_argument('--db', default=DB_NAME, help=f"SQLite database holding the queue (default: {DB_NAME})")
+    parser.add_argument('--coordinator', help="URL of a python -m coordinator to use instead of --db")
+    parser.add_argument('--token', default=COORDINATOR_TOKEN, help="the coordinator's shared secret")
+    parser.add_argument('--channel', default=None,
+                        help="browser channel such as msedge or chrome (default: bundled Chromium)")
+    parser.add_argument('--headed', action='store_true', help="show the browser windows")
+    parser.add_argument('--once', action='store_true', help="exit when the queue is empty instead of waiting")
+    parser.add_argument('--captcha-timeout', type=int, default=0,
+                        help="seconds to wait for a CAPTCHA to be solved in a headed browser (default: 0)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = dict(db_name=args.db, headless=not args.headed, channel=args.channel, once=args.once,
+                   captcha_timeout=args.captcha_timeout, coordinator=args.coordinator, token=args.token)
+    if args.processes <= 1:
+        work(**options)
+        return 0
+
+    # spawn, not fork: Playwright and SQLite connections must not be shared
+    # with a forked child
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=work, kwargs=options) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the workers too; wait for them to hand their jobs back
+        for process in processes:
+            process.join()
+    return 0 if all(process.exitcode == 0 for process in processes) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())